@@ -0,0 +1,339 @@
+# backends.py
+import hashlib
+import io
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+# The Vertex AI SDK, google.api_core and PIL are imported where they are used,
+# so importing this module costs nothing until a model is actually called.
+
+
+class ClientRegistry:
+    """A process-wide, thread-safe store of model handles.
+
+    Each handle is created once per (kind, model name) and then shared by every
+    thread. Creation time is recorded so the summary can show that client setup
+    happens once per run, not once per call.
+    """
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._creation_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.setup_seconds: Dict[Tuple[str, str], float] = {}
+        self.lookups = 0
+
+    def get(self, kind: str, model_name: str, factory: Callable[[], Any]) -> Any:
+        """Return the handle for (kind, model_name), calling `factory` only the first time."""
+        key = (kind, model_name)
+        with self._lock:
+            self.lookups += 1
+            client = self._clients.get(key)
+            if client is not None:
+                return client
+            creation_lock = self._creation_locks.setdefault(key, threading.Lock())
+        # Only threads wanting this same model wait while it is being created
+        with creation_lock:
+            with self._lock:
+                client = self._clients.get(key)
+            if client is not None:
+                return client
+            started = time.perf_counter()
+            client = factory()
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._clients[key] = client
+                self.setup_seconds[key] = elapsed
+            logging.info(f"Created {kind} client for '{model_name}' in {elapsed:.2f}s")
+            return client
+
+    @property
+    def total_setup_seconds(self) -> float:
+        with self._lock:
+            return sum(self.setup_seconds.values())
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._creation_locks.clear()
+            self.setup_seconds.clear()
+            self.lookups = 0
+
+
+# Shared by every backend in the process
+CLIENTS = ClientRegistry()
+
+
+class ModelBackend:
+    """The interface every pipeline stage uses to reach a text or image model."""
+    name = "base"
+
+    def generate_text(self, model_name: str, prompt: str, usage: Optional[Dict[str, int]] = None) -> str:
+        """Return the model's text answer to `prompt`.
+
+        When a `usage` dict is passed it is filled with whatever token counts the
+        API reports (`prompt_tokens`, `response_tokens`, `total_tokens`).
+        """
+        raise NotImplementedError
+
+    def stream_text(self, model_name: str, prompt: str, usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+        """Yield the model's text answer in chunks as it is produced.
+
+        Backends without native streaming return the whole answer as one chunk.
+        `usage` is filled once the stream is exhausted.
+        """
+        yield self.generate_text(model_name, prompt, usage)
+
+    def generate_image(self, model_name: str, prompt: str) -> bytes:
+        """Render one image for `prompt` and return its encoded bytes."""
+        raise NotImplementedError
+
+
+class VertexBackend(ModelBackend):
+    """Gemini text and Imagen images through the Vertex AI SDK."""
+    name = "vertex"
+
+    @staticmethod
+    def _text_model(model_name: str):
+        def create():
+            from vertexai.generative_models import GenerativeModel
+            return GenerativeModel(model_name)
+        return CLIENTS.get('text', model_name, create)
+
+    @staticmethod
+    def _image_model(model_name: str):
+        def create():
+            from vertexai.vision_models import ImageGenerationModel
+            return ImageGenerationModel.from_pretrained(model_name)
+        return CLIENTS.get('image', model_name, create)
+
+    @staticmethod
+    def _record_usage(response, usage: Optional[Dict[str, int]]):
+        metadata = getattr(response, 'usage_metadata', None)
+        if usage is None or metadata is None:
+            return
+        usage.update(prompt_tokens=metadata.prompt_token_count, response_tokens=metadata.candidates_token_count,
+                     total_tokens=metadata.total_token_count)
+
+    def generate_text(self, model_name: str, prompt: str, usage: Optional[Dict[str, int]] = None) -> str:
+        response = self._text_model(model_name).generate_content(prompt)
+        self._record_usage(response, usage)
+        return response.text
+
+    def stream_text(self, model_name: str, prompt: str, usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+        for chunk in self._text_model(model_name).generate_content(prompt, stream=True):
+            # Each chunk carries the running totals, so the last one wins
+            self._record_usage(chunk, usage)
+            yield chunk.text
+
+    def generate_image(self, model_name: str, prompt: str) -> bytes:
+        response = self._image_model(model_name).generate_images(prompt=prompt, number_of_images=1)
+        # Raw PNG bytes straight from the response; no round trip through a file
+        return response[0]._image_bytes
+
+
+class LatencyModel:
+    """Samples simulated call latencies from a configured distribution.
+
+    Supported specs: `{distribution: fixed, seconds}`, `{distribution: uniform, low, high}`
+    and `{distribution: lognormal, median, sigma}`.
+    """
+    def __init__(self, spec: Optional[dict], scale: float = 1.0):
+        self.spec = spec or {'distribution': 'fixed', 'seconds': 0.0}
+        self.scale = scale
+        if self.spec.get('distribution', 'fixed') not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {self.spec['distribution']}")
+
+    def sample(self, rng: random.Random) -> float:
+        kind = self.spec.get('distribution', 'fixed')
+        if kind == 'uniform':
+            seconds = rng.uniform(self.spec['low'], self.spec['high'])
+        elif kind == 'lognormal':
+            seconds = rng.lognormvariate(math.log(self.spec['median']), self.spec.get('sigma', 0.5))
+        else:
+            seconds = self.spec.get('seconds', 0.0)
+        return seconds * self.scale
+
+
+class FakeBackend(ModelBackend):
+    """A deterministic offline stand-in for Gemini and Imagen.
+
+    Answers are derived from the prompt alone, so the same prompt always gets the
+    same config JSON, plan JSON, markdown or image. Latency is simulated from
+    the configured distributions, `quota_error_rate` of calls raise
+    `ResourceExhausted` just like a real 429, and `stall_rate` of calls take
+    an extra `stall_latency`, like a request stuck on the server.
+    """
+    name = "fake"
+
+    MARKER_PATTERN = re.compile(r'\[[A-Z0-9_]+_MARKER\]')
+
+    def __init__(self, text_latency: Optional[dict] = None, image_latency: Optional[dict] = None,
+                 quota_error_rate: float = 0.0, article_paragraphs: int = 12, images_per_post: int = 4,
+                 seed: int = 0, latency_scale: float = 1.0, client_setup_latency: Optional[dict] = None,
+                 stall_rate: float = 0.0, stall_latency: Optional[dict] = None):
+        self.text_latency = LatencyModel(text_latency, latency_scale)
+        self.client_setup_latency = LatencyModel(client_setup_latency, latency_scale)
+        self.image_latency = LatencyModel(image_latency, latency_scale)
+        self.quota_error_rate = quota_error_rate
+        self.stall_rate = stall_rate
+        self.stall_latency = LatencyModel(stall_latency, latency_scale)
+        self.article_paragraphs = article_paragraphs
+        self.images_per_post = max(1, images_per_post)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {'text': 0, 'image': 0, 'quota_errors': 0, 'stalls': 0}
+
+    @classmethod
+    def from_config(cls, config: dict, **overrides) -> "FakeBackend":
+        options = dict(config.get('fake_backend', {}))
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**options)
+
+    def _client(self, kind: str, model_name: str):
+        """Simulate the one-off cost of creating a model handle."""
+        def create():
+            with self._lock:
+                delay = self.client_setup_latency.sample(self._rng)
+            time.sleep(delay)
+            return object()
+        return CLIENTS.get(kind, model_name, create)
+
+    def _sample_call(self, kind: str, latency: LatencyModel) -> Tuple[float, bool]:
+        with self._lock:
+            self.calls[kind] += 1
+            delay = latency.sample(self._rng)
+            quota_error = self._rng.random() < self.quota_error_rate
+            if quota_error:
+                self.calls['quota_errors'] += 1
+            elif self.stall_rate and self._rng.random() < self.stall_rate:
+                self.calls['stalls'] += 1
+                delay += self.stall_latency.sample(self._rng)
+        return delay, quota_error
+
+    @staticmethod
+    def _raise_quota_error():
+        from google.api_core import exceptions
+        raise exceptions.ResourceExhausted("Simulated quota exhaustion from the fake backend.")
+
+    def _simulate_call(self, kind: str, latency: LatencyModel):
+        delay, quota_error = self._sample_call(kind, latency)
+        time.sleep(delay)
+        if quota_error:
+            self._raise_quota_error()
+
+    @staticmethod
+    def _estimate_usage(prompt: str, text: str, usage: Optional[Dict[str, int]]):
+        """Fill `usage` with rough token counts (about four characters per token)."""
+        if usage is not None:
+            usage.update(prompt_tokens=len(prompt) // 4, response_tokens=len(text) // 4,
+                         total_tokens=len(prompt) // 4 + len(text) // 4)
+
+    def generate_text(self, model_name: str, prompt: str, usage: Optional[Dict[str, int]] = None) -> str:
+        self._client('text', model_name)
+        self._simulate_call('text', self.text_latency)
+        text = self._fake_text(prompt)
+        self._estimate_usage(prompt, text, usage)
+        return text
+
+    def _fake_text(self, prompt: str) -> str:
+        if 'Image Plan Structure' in prompt:
+            return self._fake_plan(prompt)
+        if 'BUSINESS CONTEXT' in prompt and 'TITLES:' in prompt:
+            return self._fake_config_batch(prompt)
+        if 'BUSINESS CONTEXT' in prompt:
+            return self._fake_config(prompt)
+        return self._fake_article(prompt)
+
+    def stream_text(self, model_name: str, prompt: str, usage: Optional[Dict[str, int]] = None,
+                    chunk_size: int = 256) -> Iterator[str]:
+        self._client('text', model_name)
+        delay, quota_error = self._sample_call('text', self.text_latency)
+        if quota_error:
+            self._raise_quota_error()
+        text = self._fake_text(prompt)
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        # Spread the simulated latency over the chunks so the first one arrives early
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield chunk
+        self._estimate_usage(prompt, text, usage)
+
+    def generate_image(self, model_name: str, prompt: str) -> bytes:
+        self._client('image', model_name)
+        self._simulate_call('image', self.image_latency)
+        from PIL import Image
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        img = Image.new('RGB', (1024, 1024), color=(digest[0], digest[1], digest[2]))
+        buffer = io.BytesIO()
+        img.save(buffer, "PNG")
+        return buffer.getvalue()
+
+    @staticmethod
+    def _quoted_title(prompt: str) -> str:
+        match = (re.search(r'TITLE: "(.*?)"', prompt) or re.search(r'"title":\s*"((?:[^"\\]|\\.)*)"', prompt)
+                 or re.search(r'^\s*title: (.+)$', prompt, re.MULTILINE))
+        return match.group(1).strip() if match else "Synthetic Post"
+
+    def _fake_config(self, prompt: str) -> str:
+        title = self._quoted_title(prompt)
+        words = re.findall(r'\w+', title.lower())
+        return json.dumps({
+            'title': title,
+            'topic': f"A practical look at {title}, covering trade-offs, costs and a migration path.",
+            'keywords': [word for word in words if len(word) > 3][:10] or ['automation'],
+            'azlo_strategic_angle': "Show how a developer-led build avoids costly rebuilds later.",
+            'image_style': "Clean isometric illustrations on a dark background with indigo accents.",
+        })
+
+    def _fake_config_batch(self, prompt: str) -> str:
+        titles = re.findall(r'^\s*\d+\. "(.*)"\s*$', prompt, re.MULTILINE)
+        return json.dumps([json.loads(self._fake_config(f'TITLE: "{title}"')) for title in titles])
+
+    def _fake_plan(self, prompt: str) -> str:
+        title = self._quoted_title(prompt)
+        markers = ['[FEATURED_IMAGE_MARKER]'] + [f'[IN_CONTENT_IMAGE_{i}_MARKER]' for i in range(1, self.images_per_post)]
+        sections = [{'title': f"Part {i}: {title}", 'talking_points': [f"Point {i}.{j}" for j in range(1, 4)]}
+                    for i in range(1, 5)]
+        return json.dumps({
+            'outline': {
+                'title': title,
+                'summary': f"What {title} means in practice and how to act on it.",
+                'introduction_heading': "Why this matters",
+                'introduction': "Manual work does not scale.",
+                'sections': sections,
+                'conclusion': "[contact Azlo.pro to discuss your project](https://azlo.pro/index.html#contact)",
+            },
+            'image_plan': [{'placement_marker': marker, 'generation_prompt': f"{title} illustration {i}",
+                            'alt_text': f"{title} figure {i}"} for i, marker in enumerate(markers)],
+        })
+
+    def _fake_article(self, prompt: str) -> str:
+        markers = list(dict.fromkeys(self.MARKER_PATTERN.findall(prompt))) or ['[FEATURED_IMAGE_MARKER]']
+        markers.sort(key=lambda marker: "FEATURED" not in marker)
+        featured, in_content = markers[0], markers[1:]
+        paragraph = ("Automation pays off when the process is understood first. " * 8).strip()
+        parts = [featured, "A synthetic summary of the article.", "---", "### Why this matters"]
+        for i in range(self.article_paragraphs):
+            if i % 3 == 0:
+                parts.append(f"## Section {i // 3 + 1}")
+            parts.append(paragraph)
+            if in_content and i % 3 == 2:
+                parts.append(in_content.pop(0))
+        parts.extend(in_content)
+        return "\n\n".join(parts) + "\n"
+
+
+def create_backend(config: dict, name: Optional[str] = None, **fake_overrides) -> ModelBackend:
+    """Build the backend named by `name` (or `backend` in config.yaml)."""
+    name = name or config.get('backend', 'vertex')
+    if name == 'vertex':
+        return VertexBackend()
+    if name == 'fake':
+        return FakeBackend.from_config(config, **fake_overrides)
+    raise ValueError(f"Unknown model backend: {name}")
@@ -0,0 +1,67 @@
+# batching.py
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class Batcher:
+    """Coalesces per-key lookups into batched calls.
+
+    Keys are queued in the order they will probably be needed with `prime()`.
+    The first `get(key)` for a key that has not been fetched yet takes it plus
+    the next `batch_size - 1` queued keys and resolves them all with a single
+    `fetch(keys)` call; concurrent `get`s for keys in that batch wait for it
+    instead of issuing their own. `fetch` returns the results it could produce
+    by key; keys it leaves out (or a batch that raises) resolve to None so the
+    caller can fall back to fetching that key on its own.
+    """
+    def __init__(self, fetch: Callable[[List[str]], Dict[str, Any]], batch_size: int):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.fetch = fetch
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._queue: List[str] = []
+        self._futures: Dict[str, Future] = {}
+        self.batches = 0
+        self.keys_fetched = 0
+        self.misses = 0
+
+    def prime(self, keys: Iterable[str]):
+        """Queue keys to be fetched alongside whichever key is asked for next."""
+        with self._lock:
+            self._queue.extend(key for key in keys if key not in self._futures)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the batched result for `key`, or None if its batch did not produce one."""
+        with self._lock:
+            future = self._futures.get(key)
+            batch = []
+            if future is None:
+                batch = [key] + [queued for queued in self._queue if queued != key and queued not in self._futures]
+                batch = list(dict.fromkeys(batch))[:self.batch_size]
+                self._queue = [queued for queued in self._queue if queued not in batch]
+                for batch_key in batch:
+                    self._futures[batch_key] = Future()
+                future = self._futures[key]
+        if batch:
+            self._run(batch)
+        result = future.result()
+        with self._lock:
+            self._futures.pop(key, None)
+        return result
+
+    def _run(self, batch: List[str]):
+        try:
+            results = self.fetch(batch)
+        except Exception as e:
+            logging.error(f"Batch of {len(batch)} failed, falling back to single requests: {e}")
+            results = {}
+        with self._lock:
+            self.batches += 1
+            self.keys_fetched += len(batch)
+            self.misses += sum(key not in results for key in batch)
+            futures = [(self._futures[key], results.get(key)) for key in batch]
+        for future, result in futures:
+            future.set_result(result)
@@ -0,0 +1,254 @@
+# benchmark.py
+"""Offline pipeline and startup benchmarks.
+
+Runs N synthetic titles through the full pipeline against the fake model
+backend and reports per-stage time, end-to-end posts per hour and peak memory,
+so performance work can be checked without Vertex AI access:
+
+    python benchmark.py --titles 50 --concurrency 8 --latency-scale 0.01
+
+With --startup it instead times fresh interpreter launches of the CLI entry
+points and lists any heavy SDK modules that get imported eagerly. Save the
+JSON output with --json to compare releases:
+
+    python benchmark.py --startup --repeat 10 --json startup.json
+"""
+import argparse
+import functools
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import main
+from backends import CLIENTS, FakeBackend
+from batching import Batcher
+from deadlines import CallDeadlines
+from metrics import Metrics, percentile
+from ratelimit import QuotaGovernor
+
+STAGES = ['generate_blog_configs', 'generate_blog_config', 'generate_plan', 'generate_article_text', 'stream_article_to_bundle',
+          'generate_images', 'assemble_bundle', 'finalize_streamed_bundle']
+
+
+def instrument_stages(timings: Dict[str, List[float]]):
+    """Wrap each pipeline stage in main so every call's wall time lands in `timings`."""
+    lock = threading.Lock()
+    for name in STAGES:
+        original = getattr(main, name)
+
+        @functools.wraps(original)
+        def timed(*args, _original=original, _name=name, **kwargs):
+            started = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            finally:
+                with lock:
+                    timings[_name].append(time.perf_counter() - started)
+
+        setattr(main, name, timed)
+
+
+def run_pipeline_benchmark(args: argparse.Namespace) -> dict:
+    """Run the synthetic titles and return the collected measurements."""
+    main.init_config(args.config)
+    work_dir = Path(tempfile.mkdtemp(prefix="blog-bench-"))
+    api_config = main.CONFIG['api']
+    api_config['initial_backoff_seconds'] *= args.latency_scale
+    api_config['max_backoff_seconds'] = api_config.get('max_backoff_seconds', 120) * args.latency_scale
+    main.BACKEND = FakeBackend.from_config(main.CONFIG, latency_scale=args.latency_scale,
+                                           quota_error_rate=args.quota_error_rate, stall_rate=args.stall_rate,
+                                           seed=args.seed)
+    main.GOVERNOR = QuotaGovernor.from_config(dict(api_config, requests_per_minute=args.rpm,
+                                                   request_burst=args.concurrency), main.is_quota_error)
+    # Deadlines are in real seconds, so they shrink with the simulated latencies
+    calls_config = main.CONFIG.get('calls') or {}
+    hedging = dict(calls_config.get('hedging') or {})
+    hedging['min_delay_seconds'] = hedging.get('min_delay_seconds', 1.0) * args.latency_scale
+    if args.hedge is not None:
+        hedging['enabled'] = args.hedge
+    main.DEADLINES = CallDeadlines.from_config({
+        'deadline_seconds': {stage: seconds * args.latency_scale
+                             for stage, seconds in (calls_config.get('deadline_seconds') or {}).items() if seconds},
+        'hedging': hedging,
+    })
+    main.RESPONSE_CACHE = None
+    main.METRICS = Metrics()
+    main.CONFIG.setdefault('streaming', {})['enabled'] = args.stream
+
+    timings: Dict[str, List[float]] = {name: [] for name in STAGES}
+    instrument_stages(timings)
+    titles = [f"Synthetic benchmark post number {i}" for i in range(1, args.titles + 1)]
+    hugo_path = str(work_dir / "posts")
+    if args.config_batch_size > 1:
+        main.CONFIG_BATCHER = Batcher(main.generate_blog_configs, args.config_batch_size)
+        main.CONFIG_BATCHER.prime(titles)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda title: main.process_single_title(title, hugo_path, False), titles))
+    elapsed = time.perf_counter() - started
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    successful = sum(results)
+    return {
+        'titles': args.titles,
+        'concurrency': args.concurrency,
+        'latency_scale': args.latency_scale,
+        'successful': successful,
+        'failed': len(results) - successful,
+        'elapsed_seconds': elapsed,
+        'posts_per_hour': successful / elapsed * 3600 if elapsed > 0 else 0.0,
+        'peak_traced_mb': peak_traced / 1_048_576,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'backend_calls': main.BACKEND.calls,
+        'clients_created': len(CLIENTS.setup_seconds),
+        'client_lookups': CLIENTS.lookups,
+        'client_setup_seconds': CLIENTS.total_setup_seconds,
+        'stages': {name: {'count': len(values), 'mean': sum(values) / len(values) if values else 0.0,
+                          'p50': percentile(values, 50), 'p95': percentile(values, 95),
+                          'max': max(values, default=0.0)}
+                   for name, values in timings.items() if values},
+        'api_calls': main.METRICS.summary('api'),
+        'api_totals': main.METRICS.totals('api'),
+        'governor': main.GOVERNOR.summary(),
+        'calls': main.DEADLINES.summary(),
+        'prompt_sizes': main.METRICS.prompt_sizes(),
+        'output_dir': str(work_dir),
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{'='*72}\n📊 Pipeline benchmark: {report['titles']} titles, concurrency {report['concurrency']}, "
+          f"latency x{report['latency_scale']}\n{'='*72}")
+    print(f"{'stage':<24}{'count':>7}{'mean s':>10}{'p50 s':>10}{'p95 s':>10}{'max s':>10}")
+    for name, stats in report['stages'].items():
+        print(f"{name:<24}{stats['count']:>7}{stats['mean']:>10.3f}{stats['p50']:>10.3f}"
+              f"{stats['p95']:>10.3f}{stats['max']:>10.3f}")
+    print(f"\n✅ {report['successful']} ok | ❌ {report['failed']} failed | "
+          f"⏱️  {report['elapsed_seconds']:.2f}s | {report['posts_per_hour']:.0f} posts/hour")
+    print(f"🧠 Peak traced memory: {report['peak_traced_mb']:.1f} MB | Max RSS: {report['max_rss_mb']:.1f} MB")
+    print(f"🔌 Backend calls: {report['backend_calls']}")
+    for name, stats in report['api_calls'].items():
+        print(f"   {name:<12} p50 {stats['p50']:.3f}s | p95 {stats['p95']:.3f}s over {stats['count']} call(s)")
+    totals = report['api_totals']
+    print(f"🔤 Tokens: {totals['prompt_tokens']:.0f} prompt / {totals['response_tokens']:.0f} response | "
+          f"retries {totals['retries']:.0f}, backoff {totals['backoff_seconds']:.2f}s")
+    for name, stats in report['prompt_sizes'].items():
+        print(f"📝 {name:<12} prompt p50 {stats['bytes_p50']:.0f} B | max {stats['bytes_max']:.0f} B "
+              f"| ~{stats['tokens_total']:.0f} tokens over {stats['count']} prompt(s)")
+    for stage, stats in report['calls'].items():
+        print(f"⏰ {stage:<12} p99 {stats['p99']:.3f}s ({stats['p99_unhedged']:.3f}s unhedged) | "
+              f"{stats['timeouts']} timeout(s), {stats['hedges']} hedge(s) sent, {stats['hedge_wins']} won "
+              f"over {stats['calls']} call(s)")
+    for model, budget in report['governor'].items():
+        print(f"🚦 {model}: limit {budget['limit']:.1f} in flight after {budget['throttles']} quota error(s) or timeout(s)")
+    print(f"🏗️  Model clients: {report['clients_created']} created for {report['client_lookups']} calls "
+          f"({report['client_setup_seconds']:.3f}s total setup)")
+
+
+# Top-level packages that should only load once a stage actually calls a model
+HEAVY_MODULES = ('google.generativeai', 'google.api_core', 'vertexai', 'PIL', 'multiprocessing', 'http.server')
+
+STARTUP_COMMANDS = {
+    'import main': [sys.executable, '-c', 'import main'],
+    'main.py --help': [sys.executable, 'main.py', '--help'],
+    'main.py validate': [sys.executable, 'main.py', 'validate'],
+    'main.py pending': [sys.executable, 'main.py', 'pending'],
+}
+
+
+def time_command(command: List[str], repeat: int) -> List[float]:
+    """Wall time of `repeat` fresh launches of `command`."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def eagerly_imported_heavy_modules() -> List[str]:
+    """Heavy modules that a bare `import main` pulls in (should be empty)."""
+    probe = ("import json, sys, main; print(json.dumps(sorted(m for m in sys.modules "
+             f"if any(m == h or m.startswith(h + '.') for h in {HEAVY_MODULES!r}))))")
+    result = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_startup_benchmark(args: argparse.Namespace) -> dict:
+    """Time each CLI entry point from a cold interpreter."""
+    baseline = time_command([sys.executable, '-c', 'pass'], args.repeat)
+    commands = {}
+    for name, command in STARTUP_COMMANDS.items():
+        samples = time_command(command, args.repeat)
+        commands[name] = {'min': min(samples), 'median': statistics.median(samples),
+                          'over_bare_python': statistics.median(samples) - statistics.median(baseline)}
+    return {
+        'python': sys.version.split()[0],
+        'repeat': args.repeat,
+        'bare_python_median': statistics.median(baseline),
+        'commands': commands,
+        'eager_heavy_modules': eagerly_imported_heavy_modules(),
+    }
+
+
+def print_startup_report(report: dict):
+    print(f"\n{'='*72}\n🚀 Startup benchmark: Python {report['python']}, {report['repeat']} runs each "
+          f"(bare interpreter {report['bare_python_median'] * 1000:.0f} ms)\n{'='*72}")
+    print(f"{'command':<24}{'min ms':>10}{'median ms':>12}{'over python ms':>16}")
+    for name, stats in report['commands'].items():
+        print(f"{name:<24}{stats['min'] * 1000:>10.0f}{stats['median'] * 1000:>12.0f}"
+              f"{stats['over_bare_python'] * 1000:>16.0f}")
+    heavy = report['eager_heavy_modules']
+    print(f"\n{'✅ No heavy SDK modules imported eagerly.' if not heavy else '⚠️  Eagerly imported: ' + ', '.join(heavy)}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the blog pipeline against the offline fake backend.")
+    parser.add_argument("--startup", action="store_true", help="Benchmark CLI startup time instead of the pipeline")
+    parser.add_argument("--repeat", type=int, default=5, help="Launches per command in --startup mode")
+    parser.add_argument("--config", default="config.yaml", help="Path to the configuration file")
+    parser.add_argument("--titles", type=int, default=20, help="Number of synthetic titles")
+    parser.add_argument("--concurrency", type=int, default=4, help="Titles processed at the same time")
+    parser.add_argument("--latency-scale", type=float, default=0.01,
+                        help="Multiplier on the fake_backend latency distributions in config.yaml")
+    parser.add_argument("--quota-error-rate", type=float, default=None,
+                        help="Fraction of fake calls that raise ResourceExhausted")
+    parser.add_argument("--stall-rate", type=float, default=None,
+                        help="Fraction of fake calls that stall for fake_backend.stall_latency")
+    parser.add_argument("--hedge", action=argparse.BooleanOptionalAction, default=None,
+                        help="Turn hedging of slow text calls on or off (default from config.yaml)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for latency and error sampling")
+    parser.add_argument("--config-batch-size", type=int, default=1,
+                        help="Generate configs for this many titles per request")
+    parser.add_argument("--stream", action="store_true", help="Stream article text straight into index.md")
+    parser.add_argument("--rpm", type=float, default=1_000_000, help="Requests-per-minute budget")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path")
+    return parser.parse_args()
+
+
+def run():
+    args = parse_args()
+    if args.startup:
+        report = run_startup_benchmark(args)
+        print_startup_report(report)
+    else:
+        report = run_pipeline_benchmark(args)
+        print_report(report)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,68 @@
+# bundle_index.py
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Set
+
+# Bundle directories are named <slug>-<YYYYmmdd-HHMMSS>, plus -N on a same-second collision
+BUNDLE_NAME_PATTERN = re.compile(r'^(?P<slug>.+?)-\d{8}-\d{6}(?:-\d+)?$')
+
+
+def slug_from_bundle_name(name: str) -> str:
+    """The title slug a bundle directory was named after (the whole name if it has no timestamp)."""
+    match = BUNDLE_NAME_PATTERN.match(name)
+    return match.group('slug') if match else name
+
+
+class BundleIndex:
+    """The set of title slugs that already have a published page bundle.
+
+    Built once from the directory names under the Hugo posts path and updated
+    as new bundles are written, so checking a title is a set lookup rather
+    than a directory scan. Only directories with an index.md count: a bundle
+    still being written (or left behind by a crash) is not published yet.
+
+    Directories are named after the plan's outline title, which can differ
+    from the title in the CSV, so `scan()` can also index the title each
+    bundle records having been generated for.
+    """
+    def __init__(self):
+        self._slugs: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def scan(cls, hugo_path: str, title_slug: Optional[Callable[[Path], Optional[str]]] = None) -> "BundleIndex":
+        """Index the published bundles under `hugo_path`.
+
+        `title_slug(bundle)` returns the slug of the title a bundle was
+        generated for, or None if it does not say.
+        """
+        index = cls()
+        posts = Path(hugo_path)
+        if posts.is_dir():
+            for entry in posts.iterdir():
+                # Hidden directories are bundles still being staged, not published ones
+                if entry.is_dir() and not entry.name.startswith('.') and (entry / "index.md").exists():
+                    index.add(slug_from_bundle_name(entry.name))
+                    recorded = title_slug(entry) if title_slug else None
+                    if recorded:
+                        index.add(recorded)
+        logging.info(f"Indexed {len(index)} published bundle(s) under {hugo_path}")
+        return index
+
+    def add(self, slug: str):
+        with self._lock:
+            self._slugs.add(slug)
+
+    def add_bundle(self, bundle_path: Path):
+        """Record a bundle directory that has just been published."""
+        self.add(slug_from_bundle_name(Path(bundle_path).name))
+
+    def __contains__(self, slug: str) -> bool:
+        with self._lock:
+            return slug in self._slugs
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._slugs)
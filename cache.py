@@ -0,0 +1,172 @@
+# cache.py
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, ContextManager, Iterator, Optional, TextIO
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case, whitespace and a trailing full stop so trivially different prompts match."""
+    return " ".join(prompt.split()).casefold().rstrip(".")
+
+
+def content_key(*parts: str) -> str:
+    """Hash the given strings into a stable hex key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """A size-capped, TTL-bounded on-disk LRU store keyed by content hash.
+
+    Each entry is a single file. Its mtime records when it was written (for the
+    TTL) and its atime is bumped on every read, so evicting the oldest atimes
+    first gives least-recently-used order across runs. With `refresh`, every
+    lookup misses but new entries are still stored.
+    """
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: Optional[float] = None, suffix: str = ".bin",
+                 refresh: bool = False):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.suffix = suffix
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = sum(p.stat().st_size for p in self.directory.glob(f"*{suffix}"))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the stored bytes for `key`, or None on a miss or expired entry."""
+        path = self._path(key)
+        with self._lock:
+            if self.refresh:
+                self.misses += 1
+                return None
+            try:
+                stat = path.stat()
+                if self.ttl_seconds is not None and time.time() - stat.st_mtime > self.ttl_seconds:
+                    self._remove(path, stat.st_size)
+                    self.misses += 1
+                    return None
+                data = path.read_bytes()
+                os.utime(path, (time.time(), stat.st_mtime))
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes):
+        """Store `data` under `key`, evicting least-recently-used entries past the size cap."""
+        with self.writing(key) as f:
+            f.write(data)
+
+    @contextmanager
+    def writing(self, key: str, encoding: Optional[str] = None) -> Iterator[IO]:
+        """Fill the entry for `key` a piece at a time; it is stored once the block exits cleanly.
+
+        Yields a temporary file (opened for text with `encoding`), so an
+        entry can be written from a stream without holding it in memory. If
+        the block raises, nothing is stored.
+        """
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'w' if encoding else 'wb', encoding=encoding,
+                      newline='' if encoding else None) as f:
+                yield f
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        with self._lock:
+            previous = path.stat().st_size if path.exists() else 0
+            size = tmp_path.stat().st_size
+            os.replace(tmp_path, path)
+            self._size += size - previous
+            self.writes += 1
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: Path, size: int):
+        try:
+            path.unlink()
+            self._size -= size
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        entries = []
+        for path in self.directory.glob(f"*{self.suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+        entries.sort()
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            self._remove(path, size)
+            self.evictions += 1
+        logging.info(f"Cache {self.directory} trimmed to {self._size / 1_048_576:.1f} MB")
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+class ResponseCache(DiskCache):
+    """Caches text model responses keyed by model name plus the exact prompt."""
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: Optional[float] = None, refresh: bool = False):
+        super().__init__(directory, max_bytes, ttl_seconds, suffix=".txt", refresh=refresh)
+
+    def get_text(self, model_name: str, prompt: str) -> Optional[str]:
+        data = self.get(content_key(model_name, prompt))
+        return data.decode('utf-8') if data is not None else None
+
+    def put_text(self, model_name: str, prompt: str, text: str):
+        self.put(content_key(model_name, prompt), text.encode('utf-8'))
+
+    def writing_text(self, model_name: str, prompt: str) -> ContextManager[TextIO]:
+        """Fill the response for `model_name` + `prompt` as it streams in (see DiskCache.writing)."""
+        return self.writing(content_key(model_name, prompt), encoding='utf-8')
+
+
+class ImageCache(DiskCache):
+    """Stores finished images keyed by model name plus the normalised prompt.
+
+    House-style featured images and recurring diagrams share prompts across
+    posts, so a hit replaces a whole image generation call. `bytes_saved`
+    counts the image bytes served from disk instead.
+    """
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: Optional[float] = None, refresh: bool = False):
+        super().__init__(directory, max_bytes, ttl_seconds, suffix=".jpg", refresh=refresh)
+        self.bytes_saved = 0
+
+    def get_image(self, model_name: str, prompt: str) -> Optional[bytes]:
+        data = self.get(content_key(model_name, normalize_prompt(prompt)))
+        if data is not None:
+            with self._lock:
+                self.bytes_saved += len(data)
+        return data
+
+    def put_image(self, model_name: str, prompt: str, data: bytes):
+        self.put(content_key(model_name, normalize_prompt(prompt)), data)
@@ -0,0 +1,108 @@
+# daemon.py
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+class SpoolDirectory:
+    """A drop folder for title CSVs.
+
+    New files are picked up from the spool's top level once they have stopped
+    changing for `settle_seconds` (so a CSV still being copied in is left
+    alone), claimed by renaming them into `processing/`, and moved to `done/`
+    or `failed/` afterwards. Renames are atomic, so two daemons watching the
+    same spool never claim the same file.
+    """
+    def __init__(self, path: str, settle_seconds: float = 2.0):
+        self.path = Path(path)
+        self.settle_seconds = settle_seconds
+        for name in ('processing', 'done', 'failed'):
+            (self.path / name).mkdir(parents=True, exist_ok=True)
+
+    def incoming(self) -> List[Path]:
+        """CSV files waiting in the spool, oldest first."""
+        now = time.time()
+        files = []
+        for entry in self.path.glob('*.csv'):
+            try:
+                modified = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if entry.is_file() and now - modified >= self.settle_seconds:
+                files.append((modified, entry))
+        return [entry for _, entry in sorted(files)]
+
+    def claim(self, path: Path) -> Optional[Path]:
+        """Move `path` into processing/; None if another daemon got to it first."""
+        target = self.path / 'processing' / path.name
+        try:
+            os.replace(path, target)
+        except FileNotFoundError:
+            return None
+        return target
+
+    def finish(self, path: Path, succeeded: bool = True) -> Path:
+        """Move a claimed file to done/ (or failed/), timestamped so repeated names never clash."""
+        target = self.path / ('done' if succeeded else 'failed') / f"{time.strftime('%Y%m%d-%H%M%S')}-{path.name}"
+        os.replace(path, target)
+        return target
+
+
+class StatusServer:
+    """A small HTTP endpoint for health checks and run status, served from a daemon thread.
+
+    GET /health answers `ok`, GET /status returns `status()` as JSON and
+    GET /metrics returns `metrics()` as Prometheus text. Binds to localhost
+    by default: it is meant for a local probe or scraper, not the internet.
+    """
+    def __init__(self, status: Callable[[], Dict[str, Any]], metrics: Callable[[], str],
+                 host: str = "127.0.0.1", port: int = 8765):
+        routes = {
+            '/health': lambda: (b"ok\n", "text/plain; charset=utf-8"),
+            '/status': lambda: (json.dumps(status(), indent=2).encode('utf-8'), "application/json"),
+            '/metrics': lambda: (metrics().encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8"),
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                route = routes.get(self.path.split('?', 1)[0])
+                if route is None:
+                    self.send_error(404)
+                    return
+                try:
+                    body, content_type = route()
+                except Exception as e:
+                    logging.error(f"Status endpoint {self.path} failed: {e}", exc_info=True)
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Status request: {format % args}")
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StatusServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="status-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
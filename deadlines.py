@@ -0,0 +1,280 @@
+# deadlines.py
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from queue import Empty, Queue
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+from metrics import percentile
+
+
+class CallTimeout(TimeoutError):
+    """A model call ran past its stage's deadline."""
+
+
+def start_thread(fn: Callable[[], Any], name: str) -> Future:
+    """Run `fn` on a new daemon thread and return a future for its result.
+
+    A thread of its own rather than a pool worker, so a call that never
+    returns cannot starve later calls or hold up interpreter exit.
+    """
+    future: Future = Future()
+    future.set_running_or_notify_cancel()
+
+    def run():
+        try:
+            future.set_result(fn())
+        except BaseException as error:
+            future.set_exception(error)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+
+_END = object()
+
+
+class CallRecord:
+    """Timing of one finished call: what it took, and what it would have taken without its hedge."""
+    __slots__ = ('started', 'seconds', 'unhedged_seconds')
+
+    def __init__(self, started: float, seconds: float, unhedged_seconds: Optional[float]):
+        self.started = started
+        self.seconds = seconds
+        self.unhedged_seconds = unhedged_seconds
+
+
+class CallDeadlines:
+    """Per-stage deadlines for model calls, with optional hedging of slow text calls.
+
+    A call runs on its own thread and is given up on once it passes its
+    stage's deadline, raising CallTimeout. That is a TimeoutError, which the
+    quota governor treats like a quota error: the model's limit shrinks and
+    the call is retried after a backoff. A blocking SDK call cannot be
+    cancelled, so an abandoned call finishes in the background and its
+    answer is discarded; `on_abandon` is given its future so the caller can
+    keep its quota slot taken until then.
+
+    With hedging on, a call still running past its stage's observed p95 gets
+    a duplicate if capacity is free at that moment, and whichever answers
+    first is used. A stage's p95 is only
+    trusted after `min_samples` calls, and at most `max_hedge_ratio` of its
+    calls are hedged, which caps the extra load. When a hedge wins, the
+    original call is still timed to the end, so the summary can compare p99
+    latency with and without hedging. With `history`, only each stage's most
+    recent `history` calls are kept for those percentiles (the counts still
+    cover every call), so a long-running process does not grow without limit.
+    """
+    def __init__(self, deadlines: Optional[Dict[str, float]] = None, hedging: bool = False,
+                 hedge_percentile: float = 95, min_samples: int = 20, max_hedge_ratio: float = 0.1,
+                 min_hedge_delay: float = 1.0, window: int = 200, history: Optional[int] = None):
+        self.deadlines = {stage: seconds for stage, seconds in (deadlines or {}).items() if seconds}
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = max(1, min_samples)
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_hedge_delay = min_hedge_delay
+        self._lock = threading.Lock()
+        self._recent: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._records: Dict[str, Deque[CallRecord]] = defaultdict(lambda: deque(maxlen=history))
+        self._counts: Dict[str, Counter] = defaultdict(Counter)
+
+    @classmethod
+    def from_config(cls, calls_config: Optional[Dict], history: Optional[int] = None) -> "CallDeadlines":
+        """Build the deadlines from the `calls` section of config.yaml."""
+        calls_config = calls_config or {}
+        hedging = calls_config.get('hedging') or {}
+        return cls(calls_config.get('deadline_seconds'), hedging=bool(hedging.get('enabled')),
+                   hedge_percentile=hedging.get('percentile', 95), min_samples=hedging.get('min_samples', 20),
+                   max_hedge_ratio=hedging.get('max_ratio', 0.1),
+                   min_hedge_delay=hedging.get('min_delay_seconds', 1.0), history=history)
+
+    def deadline(self, stage: str) -> Optional[float]:
+        """Seconds one call of `stage` may take, or None for no deadline."""
+        return self.deadlines.get(stage)
+
+    def hedge_delay(self, stage: str) -> Optional[float]:
+        """Seconds after which a `stage` call gets a hedge, or None while hedging does not apply."""
+        if not self.hedging:
+            return None
+        with self._lock:
+            recent = list(self._recent[stage])
+        if len(recent) < self.min_samples:
+            return None
+        delay = max(self.min_hedge_delay, percentile(recent, self.hedge_percentile))
+        deadline = self.deadline(stage)
+        return delay if deadline is None or delay < deadline else None
+
+    def _within_hedge_ratio(self, stage: str) -> bool:
+        with self._lock:
+            counts = self._counts[stage]
+            return counts['hedges'] + 1 <= self.max_hedge_ratio * counts['calls']
+
+    def _record(self, stage: str, started: float, seconds: float, unhedged_seconds: Optional[float]) -> CallRecord:
+        record = CallRecord(started, seconds, unhedged_seconds)
+        with self._lock:
+            self._recent[stage].append(seconds)
+            self._records[stage].append(record)
+        return record
+
+    def _timed_out(self, stage: str, stats: Dict[str, Any]) -> CallTimeout:
+        stats['timeouts'] += 1
+        with self._lock:
+            self._counts[stage]['timeouts'] += 1
+        return CallTimeout(f"The {stage} call passed its {self.deadline(stage):g}s deadline.")
+
+    @staticmethod
+    def _init_stats(stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        stats = stats if stats is not None else {}
+        for key in ('timeouts', 'hedges', 'hedge_wins'):
+            stats.setdefault(key, 0)
+        return stats
+
+    def run(self, stage: str, fn: Callable[[], Any], hedge: Optional[Callable[[], Any]] = None,
+            stats: Optional[Dict[str, Any]] = None,
+            on_abandon: Optional[Callable[[Future], None]] = None) -> Any:
+        """Return `fn()`, raising CallTimeout once it runs past the stage's deadline.
+
+        `hedge` is only called once the call runs past the hedge delay. It
+        must return straight away, either with the function that sends the
+        duplicate (run on its own thread) or with None when no capacity is
+        free, in which case no hedge is sent. `stats` (e.g. a metrics event)
+        gets `timeouts`, `hedges` and `hedge_wins` added to it; a hedge is
+        only counted once it is sent. `on_abandon` gets the future of the call
+        when it is left running, timed out or beaten by its hedge (a hedge
+        holds its own capacity and is never passed on).
+        """
+        stats = self._init_stats(stats)
+        with self._lock:
+            self._counts[stage]['calls'] += 1
+        deadline = self.deadline(stage)
+        hedge_after = self.hedge_delay(stage) if hedge is not None else None
+        started = time.monotonic()
+        if deadline is None and hedge_after is None:
+            result = fn()
+            seconds = time.monotonic() - started
+            self._record(stage, started, seconds, seconds)
+            return result
+
+        primary = start_thread(fn, f"{stage}-call")
+        pending = {primary}
+        hedged: Optional[Future] = None
+        error: Optional[BaseException] = None
+        while True:
+            elapsed = time.monotonic() - started
+            waits = [limit - elapsed for limit in (deadline, hedge_after if hedged is None else None)
+                     if limit is not None]
+            done, pending = wait(pending, timeout=max(0.0, min(waits)) if waits else None,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return self._won(stage, started, future, primary, stats, on_abandon)
+                if error is None or future is primary:
+                    error = future.exception()
+            if not pending:
+                raise error
+            elapsed = time.monotonic() - started
+            if deadline is not None and elapsed >= deadline:
+                if on_abandon is not None and not primary.done():
+                    on_abandon(primary)
+                raise self._timed_out(stage, stats)
+            if hedged is None and hedge_after is not None and elapsed >= hedge_after:
+                hedge_after = None
+                send_hedge = hedge() if not primary.done() and self._within_hedge_ratio(stage) else None
+                if send_hedge is None:
+                    continue
+                logging.info(f"🪁 {stage} call still running after {elapsed:.1f}s (past its "
+                             f"p{self.hedge_percentile:g}); sending a hedge.")
+                stats['hedges'] += 1
+                with self._lock:
+                    self._counts[stage]['hedges'] += 1
+                hedged = start_thread(send_hedge, f"{stage}-hedge")
+                pending.add(hedged)
+
+    def _won(self, stage: str, started: float, winner: Future, primary: Future, stats: Dict[str, Any],
+             on_abandon: Optional[Callable[[Future], None]]) -> Any:
+        seconds = time.monotonic() - started
+        if winner is primary:
+            self._record(stage, started, seconds, seconds)
+            return winner.result()
+        stats['hedge_wins'] += 1
+        with self._lock:
+            self._counts[stage]['hedge_wins'] += 1
+        record = self._record(stage, started, seconds, None)
+
+        def time_original(done: Future):
+            record.unhedged_seconds = time.monotonic() - started
+
+        primary.add_done_callback(time_original)
+        if on_abandon is not None and not primary.done():
+            on_abandon(primary)
+        return winner.result()
+
+    def stream(self, stage: str, chunks: Iterator[str], stats: Optional[Dict[str, Any]] = None,
+               on_abandon: Optional[Callable[[Future], None]] = None) -> Iterator[str]:
+        """Yield from `chunks`, raising CallTimeout once the whole stream runs past the stage's deadline.
+
+        The chunks are pulled on their own thread, so a stalled stream cannot
+        block the caller past the deadline; `on_abandon` gets that thread's
+        future if the stream is left before it ends. Streams are never hedged:
+        chunks already passed on cannot be swapped for another answer's.
+        """
+        stats = self._init_stats(stats)
+        with self._lock:
+            self._counts[stage]['calls'] += 1
+        deadline = self.deadline(stage)
+        started = time.monotonic()
+        if deadline is None:
+            yield from chunks
+        else:
+            received: Queue = Queue()
+
+            def pump():
+                try:
+                    for chunk in chunks:
+                        received.put((chunk, None))
+                    received.put((_END, None))
+                except BaseException as error:
+                    received.put((_END, error))
+
+            pumping = start_thread(pump, f"{stage}-stream")
+            try:
+                while True:
+                    try:
+                        chunk, error = received.get(timeout=max(0.0, started + deadline - time.monotonic()))
+                    except Empty:
+                        raise self._timed_out(stage, stats) from None
+                    if chunk is _END:
+                        if error is not None:
+                            raise error
+                        break
+                    yield chunk
+            finally:
+                if on_abandon is not None and not pumping.done():
+                    on_abandon(pumping)
+        seconds = time.monotonic() - started
+        self._record(stage, started, seconds, seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Calls, timeouts, hedges sent and won, and p95/p99 seconds with and without hedging, by stage.
+
+        A hedged call whose original has not finished yet counts as taking
+        at least as long as it has been running.
+        """
+        now = time.monotonic()
+        with self._lock:
+            records = {stage: list(stage_records) for stage, stage_records in self._records.items()}
+            counts = {stage: Counter(stage_counts) for stage, stage_counts in self._counts.items()}
+        summary = {}
+        for stage, stage_counts in counts.items():
+            stage_records = records.get(stage, [])
+            seconds = [record.seconds for record in stage_records]
+            unhedged = [record.unhedged_seconds if record.unhedged_seconds is not None else now - record.started
+                        for record in stage_records]
+            summary[stage] = {'calls': stage_counts['calls'], 'timeouts': stage_counts['timeouts'],
+                              'hedges': stage_counts['hedges'], 'hedge_wins': stage_counts['hedge_wins'],
+                              'p95': percentile(seconds, 95), 'p99': percentile(seconds, 99),
+                              'p99_unhedged': percentile(unhedged, 99)}
+        return summary
@@ -0,0 +1,120 @@
+# imaging.py
+import functools
+import io
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import List, Sequence
+
+# PIL is imported inside each function so importing this module stays cheap.
+
+VARIANT_FORMATS = {'jpeg': ('JPEG', 'jpg'), 'webp': ('WEBP', 'webp')}
+
+
+def encode_jpeg(image_bytes: bytes, quality: int = 85) -> bytes:
+    """Decode raw model output once and re-encode it as an RGB JPEG, all in memory."""
+    from PIL import Image
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def write_atomic(data: bytes, output_path: Path):
+    """Write `data` to a temp file beside `output_path` and rename it into place.
+
+    The temp name is unique to the writing thread, so concurrent writers of
+    the same path never share one; the last rename wins.
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, output_path)
+
+
+def link_or_copy(source: Path, dest: Path):
+    """Hardlink `dest` to `source`, falling back to a copy where links are unsupported."""
+    dest = Path(dest)
+    if dest.exists():
+        dest.unlink()
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+
+@functools.lru_cache(maxsize=None)
+def placeholder_font(size: int = 30):
+    """Load the placeholder font once per size; resolving a TrueType font is slow."""
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except IOError:
+        return ImageFont.load_default()
+
+
+def wrap_placeholder_text(prompt: str, line_length: int = 60) -> List[str]:
+    """Heading plus the prompt wrapped to roughly `line_length` characters per line."""
+    words = prompt.split()
+    lines = ["FALLBACK (API Error/Refusal):", ""]
+    current_line = ""
+    for word in words:
+        if len(current_line) + len(word) + 1 < line_length:
+            current_line += f" {word}"
+        else:
+            lines.append(current_line.strip())
+            current_line = word
+    lines.append(current_line.strip())
+    return lines
+
+
+@functools.lru_cache(maxsize=64)
+def render_placeholder(prompt: str, width: int = 1200, height: int = 630) -> bytes:
+    """Render the fallback image for `prompt` as JPEG bytes.
+
+    Cached, so a prompt that keeps failing is only drawn once per process.
+    """
+    from PIL import Image, ImageDraw
+    img = Image.new('RGB', (width, height), color=(26, 26, 26))
+    draw = ImageDraw.Draw(img)
+    font = placeholder_font()
+    lines = wrap_placeholder_text(prompt)
+    y_text = (height - (len(lines) * 40)) / 2
+    for i, line in enumerate(lines):
+        # Use getbbox for accurate width calculation, then center the line
+        left, top, right, bottom = font.getbbox(line)
+        draw.text(((width - (right - left)) / 2, y_text + i * 45), line, font=font, fill=(255, 100, 100))
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def render_variants(source_path: str, widths: Sequence[int], formats: Sequence[str], quality: int = 80) -> List[str]:
+    """Write resized copies of an image as `<stem>-<width>w.<ext>` next to it.
+
+    Runs in a worker process, so it takes and returns plain paths. Widths at or
+    above the source width are skipped rather than upscaled.
+    """
+    from PIL import Image
+    source = Path(source_path)
+    written = []
+    with Image.open(source) as img:
+        img = img.convert("RGB")
+        for width in sorted(set(widths)):
+            if width >= img.width:
+                continue
+            height = round(img.height * width / img.width)
+            resized = img.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                pil_format, extension = VARIANT_FORMATS[fmt.lower()]
+                dest = source.with_name(f"{source.stem}-{width}w.{extension}")
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, quality=quality)
+                write_atomic(buffer.getvalue(), dest)
+                written.append(str(dest))
+    logging.info(f"Rendered {len(written)} responsive variants of {source.name}")
+    return written
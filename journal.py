@@ -0,0 +1,84 @@
+# journal.py
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+
+
+def journal_path_for(csv_path: str) -> Path:
+    """The journal lives next to the CSV it tracks, e.g. blog_titles.journal.jsonl."""
+    csv_file = Path(csv_path)
+    return csv_file.with_name(f"{csv_file.stem}.journal.jsonl")
+
+
+class RunJournal:
+    """An append-only JSONL record of each title's completed pipeline stages.
+
+    Every line is one finished stage: `{"title", "stage", "output", "at"}`.
+    Lines are flushed and fsync'ed as they are written, so a crash loses at
+    most the stage that was running. Per-image progress is recorded under the
+    `image` stage and collected into a marker -> path mapping.
+    """
+    def __init__(self, path: Path, read_only: bool = False):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._file = None
+        if self.path.exists():
+            self._load()
+        if not read_only:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write; everything before it is intact
+                    logging.warning(f"Ignoring unreadable journal line {line_number} in {self.path}")
+                    continue
+                self._apply(entry)
+        logging.info(f"Loaded journal {self.path} ({len(self._state)} titles)")
+
+    def _apply(self, entry: dict):
+        stages = self._state.setdefault(entry['title'], {})
+        if entry['stage'] == 'image':
+            stages.setdefault('image', {})[entry['output']['marker']] = entry['output']['path']
+        else:
+            stages[entry['stage']] = entry['output']
+
+    def stages(self, title: str) -> Dict[str, Any]:
+        """Return a copy of the completed stages and their outputs for `title`."""
+        with self._lock:
+            stages = dict(self._state.get(title, {}))
+            if 'image' in stages:
+                stages['image'] = dict(stages['image'])
+            return stages
+
+    def is_done(self, title: str) -> bool:
+        with self._lock:
+            return 'bundle' in self._state.get(title, {})
+
+    def record(self, title: str, stage: str, output: Any):
+        """Durably append a finished stage for `title`."""
+        if self._file is None:
+            raise RuntimeError(f"Journal {self.path} was opened read-only.")
+        entry = {'title': title, 'stage': stage, 'output': output, 'at': datetime.now().astimezone().isoformat()}
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._apply(entry)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
@@ -6,23 +6,37 @@ import re
 import logging
 import time
 import csv
+import argparse
+import signal
+import socket
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
-import google.generativeai as genai
-from google.generativeai.client import configure
-from PIL import Image, ImageDraw, ImageFont
-from google.api_core import exceptions
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import shutil
 
 # --- New imports for the loading spinner ---
 import threading
 import itertools
 
-# --- Vertex AI imports ---
-import vertexai
-from vertexai.generative_models import GenerativeModel
-from vertexai.vision_models import ImageGenerationModel
+# The Google SDKs and PIL are imported inside the functions that need them, so
+# importing this module (or running a quick subcommand) stays fast.
+from batching import Batcher
+from deadlines import CallDeadlines
+from bundle_index import BundleIndex
+from backends import CLIENTS, ModelBackend, VertexBackend, create_backend
+from cache import ImageCache, ResponseCache
+from imaging import encode_jpeg, link_or_copy, render_placeholder, render_variants, write_atomic
+from journal import RunJournal, journal_path_for
+from metrics import Metrics
+from prompts import (get_article_generation_prompt, get_config_batch_prompt, get_config_generation_prompt,
+                     get_plan_generation_prompt, prompt_size)
+from stages import StageGraph
+from streaming import AtomicTextWriter, MarkerReplacer, commit_partial
+from ratelimit import QuotaGovernor
+from workqueue import LeaseHeartbeat, WorkQueue
 
 # --- Configuration Loader ---
 def load_config(config_path='config.yaml') -> Dict:
@@ -40,27 +54,103 @@ def load_config(config_path='config.yaml') -> Dict:
         sys.exit(1)
 
 # --- Global Configuration ---
-CONFIG = load_config()
+# Filled in by init_config(); main() calls it, other tools call it themselves.
+CONFIG: Dict = {}
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# --- Quota Governor ---
+# Every Gemini and Imagen call is admitted and retried through this, so pacing
+# holds no matter how many titles are in flight at once.
+GOVERNOR: Optional[QuotaGovernor] = None
+# Per-stage deadlines (and optional hedging) for every single model call
+DEADLINES = CallDeadlines()
+
+def is_quota_error(error: BaseException) -> bool:
+    """True for a 429 / quota exhaustion from the Google APIs (real or simulated)."""
+    from google.api_core import exceptions
+    return isinstance(error, exceptions.ResourceExhausted)
+
+def init_config(config_path: str = 'config.yaml', build_governor: bool = True) -> Dict:
+    """Load config.yaml into CONFIG and build the quota governor and call deadlines from it.
+
+    The quick commands pass `build_governor=False`: they make no model calls,
+    and `validate` must be able to report the settings the governor rejects.
+    """
+    global GOVERNOR, DEADLINES
+    CONFIG.clear()
+    CONFIG.update(load_config(config_path) or {})
+    if build_governor:
+        try:
+            GOVERNOR = QuotaGovernor.from_config(CONFIG.get('api') or {}, is_quota_error)
+            DEADLINES = CallDeadlines.from_config(CONFIG.get('calls'))
+        except (TypeError, ValueError) as e:
+            logging.error("FATAL: Invalid 'api' or 'calls' settings in %s: %s (run 'main.py validate')", config_path, e)
+            sys.exit(1)
+    return CONFIG
+
+# --- Model Backend ---
+# Every stage reaches Gemini/Imagen through this; main() may swap in the offline fake.
+BACKEND: ModelBackend = VertexBackend()
+
+# --- Responsive Image Variants ---
+# A process pool (created in main() when enabled) so resizing/encoding never holds the GIL
+# that the API-bound threads need.
+VARIANT_POOL: Optional[Executor] = None
+# Jobs still running; each one drops out as it finishes
+VARIANT_FUTURES: Set[Future] = set()
+
+# --- Config Batching ---
+# When config_batch_size > 1, main() sets this up so config stages share requests.
+CONFIG_BATCHER: Optional[Batcher] = None
+
+# --- Published Bundles ---
+# Slugs of bundles already under the Hugo posts path; main() builds it at startup.
+BUNDLE_INDEX: Optional[BundleIndex] = None
+
+# --- Run Metrics ---
+# Stage and API call timings. Kept in memory only until main() points it at the
+# run's JSONL file from config.yaml.
+METRICS = Metrics()
+
+# --- Response Cache ---
+# Set up in main() from config.yaml and the --no-cache/--refresh flags.
+RESPONSE_CACHE: Optional[ResponseCache] = None
+# Finished images keyed by model + normalised prompt, shared across posts.
+IMAGE_CACHE: Optional[ImageCache] = None
+
 # --- NEW: Loading Spinner Class ---
 class LoadingSpinner:
     """A context manager for showing a loading spinner in the console."""
-    def __init__(self, text: str = "Loading...", delay: float = 0.1):
+    def __init__(self, text: str = "Loading...", delay: float = 0.1, enabled: bool = True):
         self.spinner = itertools.cycle(['-', '/', '|', '\\'])
         self.delay = delay
         self.text = text
+        self.enabled = enabled
+        self.width = len(text)
         self.busy = False
         self.thread = None
 
     def _spin(self):
         while self.busy:
             # Use \r (carriage return) to move cursor to the beginning of the line
-            sys.stdout.write(f"\r{self.text} {next(self.spinner)}")
+            line = f"{self.text} {next(self.spinner)}"
+            # Pad with spaces so a shorter text fully overwrites a longer one
+            sys.stdout.write(f"\r{line.ljust(self.width)}")
+            self.width = max(self.width, len(line))
             sys.stdout.flush()
             time.sleep(self.delay)
 
+    def update(self, text: str):
+        """Change the spinner text while it is running."""
+        self.text = text
+        if not self.enabled:
+            logging.info(text)
+
     def __enter__(self):
+        # Concurrent titles would fight over the same console line, so they log instead
+        if not self.enabled:
+            logging.info(self.text)
+            return self
         self.busy = True
         # The spinner runs on a separate thread
         self.thread = threading.Thread(target=self._spin)
@@ -68,13 +158,15 @@ class LoadingSpinner:
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
+        if not self.enabled:
+            return False
         self.busy = False
         # Add a check to ensure the thread was successfully created
         if self.thread is not None:
             self.thread.join()
         
         # Clear the spinner line and move cursor to the beginning
-        sys.stdout.write('\r' + ' ' * (len(self.text) + 2) + '\r')
+        sys.stdout.write('\r' + ' ' * (self.width + 2) + '\r')
         sys.stdout.flush()
         
         # If an exception occurred, it will be re-raised
@@ -91,41 +183,115 @@ def slugify(text: str) -> str:
 
 def create_placeholder_image(prompt: str, output_path: str):
     """Create a placeholder image when API generation fails."""
-    width, height = 1200, 630
     try:
-        img = Image.new('RGB', (width, height), color=(26, 26, 26))
-        draw = ImageDraw.Draw(img)
-        try:
-            font = ImageFont.truetype("arial.ttf", 30)
-        except IOError:
-            font = ImageFont.load_default()
-
-        # Simple text wrapping
-        words = prompt.split()
-        lines = ["FALLBACK (API Error/Refusal):", ""]
-        current_line = ""
-        for word in words:
-            if len(current_line) + len(word) + 1 < 60: # Character limit per line
-                current_line += f" {word}"
-            else:
-                lines.append(current_line.strip())
-                current_line = word
-        lines.append(current_line.strip())
-
-        y_text = (height - (len(lines) * 40)) / 2
-        for i, line in enumerate(lines):
-            # Use getbbox for accurate width and height calculation
-            left, top, right, bottom = font.getbbox(line)
-            text_width = right - left
-            
-            # Center the text accurately
-            draw.text(((width - text_width) / 2, y_text + i * 45), line, font=font, fill=(255, 100, 100))
-        img.save(output_path, "JPEG")
+        write_atomic(render_placeholder(prompt), Path(output_path))
         logging.info(f"Successfully created placeholder image: {output_path}")
     except Exception as e:
         logging.error(f"Failed to create placeholder image {output_path}: {e}", exc_info=True)
         raise
 
+def parse_json_response(text: str) -> Any:
+    """Parse a model's JSON answer, tolerating markdown code fences."""
+    return json.loads(re.sub(r'```json\n?|```', '', text).strip())
+
+def build_prompt(stage: str, builder: Callable[..., str], *args) -> str:
+    """Build a stage's prompt and record its size, warning if it is over the configured budget."""
+    started = time.perf_counter()
+    prompt = builder(*args)
+    size = prompt_size(prompt)
+    METRICS.record('prompt', stage, time.perf_counter() - started, **size)
+    budget = CONFIG.get('prompts', {}).get('max_tokens_estimate')
+    if budget and size['prompt_tokens_estimate'] > budget:
+        logging.warning(f"The {stage} prompt is about {size['prompt_tokens_estimate']} tokens, "
+                        f"over the {budget} token budget.")
+    return prompt
+
+def call_text_model(model_name: str, prompt: str, parse: Optional[Callable[[str], Any]] = None,
+                    stage: str = 'text') -> Any:
+    """Send a prompt to a Gemini model, serving repeated prompts from the response cache.
+
+    When `parse` is given, its result is returned and the response is only cached
+    once it parses, so a malformed answer is asked for again on the next run.
+    Each attempt is held to `stage`'s deadline and may be hedged.
+    """
+    cached = RESPONSE_CACHE.get_text(model_name, prompt) if RESPONSE_CACHE else None
+    if cached is not None:
+        logging.info(f"♻️  Response cache hit for '{model_name}' ({len(prompt)} char prompt)")
+        return parse(cached) if parse else cached
+
+    def send() -> Tuple[str, Dict[str, int]]:
+        usage: Dict[str, int] = {}
+        return BACKEND.generate_text(model_name, prompt, usage), usage
+
+    def hedge() -> Optional[Callable[[], Tuple[str, Dict[str, int]]]]:
+        # Only sent if the model has a free slot and rate tokens right now: a hedge that
+        # queued for quota would go out after the original had answered anyway
+        if not GOVERNOR.try_admit(model_name):
+            return None
+
+        def send_hedge() -> Tuple[str, Dict[str, int]]:
+            error = None
+            try:
+                return send()
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                GOVERNOR.release(model_name, error)
+        return send_hedge
+
+    with METRICS.timed('api', 'text', model=model_name, stage=stage, prompt_chars=len(prompt)) as call:
+        text, usage = GOVERNOR.call(
+            model_name, lambda slot: DEADLINES.run(stage, send, hedge, call, on_abandon=slot.hold), call)
+        call.update(response_chars=len(text), **usage)
+    result = parse(text) if parse else text
+    if RESPONSE_CACHE:
+        RESPONSE_CACHE.put_text(model_name, prompt, text)
+    return result
+
+def stream_text_model(model_name: str, prompt: str, stage: str = 'text') -> Iterator[str]:
+    """Like call_text_model, but yields the answer in chunks as the model produces it.
+
+    A cache hit is yielded as a single chunk. Chunks are never collected:
+    with the cache enabled they are written straight into the cache entry,
+    which is only kept if the stream completes. Streams are held to
+    `stage`'s deadline but never hedged.
+    """
+    cached = RESPONSE_CACHE.get_text(model_name, prompt) if RESPONSE_CACHE else None
+    if cached is not None:
+        logging.info(f"♻️  Response cache hit for '{model_name}' ({len(prompt)} char prompt)")
+        yield cached
+        return
+
+    cache_entry = RESPONSE_CACHE.writing_text(model_name, prompt) if RESPONSE_CACHE else nullcontext()
+    with cache_entry as cached_copy, \
+            METRICS.timed('api', 'text_stream', model=model_name, stage=stage, prompt_chars=len(prompt),
+                          retries=0, backoff_seconds=0.0, queue_seconds=0.0) as call:
+        usage: Dict[str, int] = {}
+        response_chars = 0
+        for attempt in itertools.count():
+            try:
+                with GOVERNOR.slot(model_name) as slot:
+                    call['queue_seconds'] += slot.waited
+                    for chunk in DEADLINES.stream(stage, BACKEND.stream_text(model_name, prompt, usage), call,
+                                                  on_abandon=slot.hold):
+                        if cached_copy is not None:
+                            cached_copy.write(chunk)
+                        response_chars += len(chunk)
+                        yield chunk
+                break
+            except Exception as e:
+                # Chunks already yielded cannot be taken back, so only a failure before the first is retried
+                delay = None if response_chars else GOVERNOR.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                reason = "Timed out" if isinstance(e, TimeoutError) else "Quota exceeded"
+                logging.warning(f"{reason} for '{model_name}', retrying the stream in {delay:.1f}s...")
+                call['retries'] += 1
+                call['backoff_seconds'] += delay
+                time.sleep(delay)
+        call.update(response_chars=response_chars, **usage)
+
 # --- Configuration Generation ---
 def generate_blog_config(title: str) -> Optional[dict]:
     """Generate blog configuration using the model specified in config."""
@@ -133,260 +299,905 @@ def generate_blog_config(title: str) -> Optional[dict]:
     # --- USES CONFIG ---
     model_name = CONFIG['models']['config_generation_model']
     context = CONFIG['azlo_pro_context']
-    model = GenerativeModel(model_name)
-
-    prompt_template = f"""
-    You are a strategic content creator for a freelance developer whose business is described below.
-    BUSINESS CONTEXT:
-    ---
-    {context}
-    ---
-    Your task is to generate the content for a blog post configuration based on the TITLE: "{title}"
-    Generate the following fields: `title`, `topic`, `keywords` (JSON list), `azlo_strategic_angle`, `image_style`.
-    Ensure `topic`, `azlo_strategic_angle`, and `image_style` are single continuous paragraphs.
-    Respond ONLY with a valid JSON object. Example: {{"title": "...", "topic": "...", "keywords": ["kw1", "kw2"], "azlo_strategic_angle": "...", "image_style": "..."}}
-    """
+
+    prompt_template = build_prompt('config', get_config_generation_prompt, title, context)
     try:
-        response = model.generate_content(prompt_template)
-        cleaned_json = re.sub(r'```json\n?|```', '', response.text).strip()
-        return json.loads(cleaned_json)
+        return call_text_model(model_name, prompt_template, parse_json_response, stage='config')
     except (json.JSONDecodeError, Exception) as e:
         logging.error(f"Error generating config: {e}")
         return None
 
+CONFIG_STRING_FIELDS = ('title', 'topic', 'azlo_strategic_angle', 'image_style')
+
+def is_valid_blog_config(entry: Any) -> bool:
+    """True if a generated config has every field the later stages rely on."""
+    return (isinstance(entry, dict)
+            and all(isinstance(entry.get(key), str) and entry[key].strip() for key in CONFIG_STRING_FIELDS)
+            and isinstance(entry.get('keywords'), list))
+
+def generate_blog_configs(titles: List[str]) -> Dict[str, dict]:
+    """Generate configurations for several titles with a single request.
+
+    The business context is sent once for the whole batch. Returns the valid
+    entries by requested title; titles left out should be generated one at a
+    time with generate_blog_config.
+    """
+    logging.info(f"🤖 Generating configs for {len(titles)} title(s) in one request...")
+    # --- USES CONFIG ---
+    model_name = CONFIG['models']['config_generation_model']
+    context = CONFIG['azlo_pro_context']
+    prompt_template = build_prompt('config_batch', get_config_batch_prompt, titles, context)
+
+    def parse_batch(text: str) -> list:
+        entries = parse_json_response(text)
+        if not isinstance(entries, list):
+            raise ValueError("Batched config response is not a JSON array.")
+        return entries
+
+    entries = call_text_model(model_name, prompt_template, parse_batch, stage='config_batch')
+    requested = {title.strip().casefold() for title in titles}
+
+    def entry_title(entry: Any) -> Optional[str]:
+        if isinstance(entry, dict) and isinstance(entry.get('title'), str):
+            return entry['title'].strip().casefold()
+        return None
+
+    by_title = {entry_title(entry): entry for entry in entries if entry_title(entry) is not None}
+    configs = {}
+    for i, title in enumerate(titles):
+        entry = by_title.get(title.strip().casefold())
+        if entry is None and len(entries) == len(titles) and entry_title(entries[i]) not in requested:
+            # The model reworded the title; fall back to its position in the array, unless
+            # that entry is another requested title's config
+            entry = entries[i]
+        if is_valid_blog_config(entry):
+            configs[title] = entry
+        else:
+            logging.warning(f"Batched config for '{title}' is missing or invalid; it will be generated on its own.")
+    return configs
+
+def get_blog_config(title: str) -> Optional[dict]:
+    """Config for `title`, from the shared batch when batching is on, else its own request."""
+    if CONFIG_BATCHER is not None:
+        article_idea = CONFIG_BATCHER.get(title)
+        if article_idea is not None:
+            return article_idea
+    return generate_blog_config(title)
+
 # --- Blog Generation Functions ---
 def generate_plan(config: dict) -> dict:
     """Generate blog outline and image plan."""
     # --- USES CONFIG ---
     model_name = CONFIG['models']['text_model_name']
     logging.info(f"Generating outline using '{model_name}'...")
-    model = GenerativeModel(model_name)
-
-    base_prompt = """
-    You are a senior content strategist for Azlo.pro. Create a plan for a blog post.
-    **Outline Structure:** `title`, `summary`, `introduction_heading`, `introduction`, `sections` (array of {title, talking_points}), `conclusion`.
-    The `conclusion` MUST end with a markdown link: `[contact Azlo.pro to discuss your project](https://azlo.pro/index.html#contact)`.
-    **Image Plan Structure:** An array of {`placement_marker`, `generation_prompt`, `alt_text`}.
-    The first image marker MUST be `[FEATURED_IMAGE_MARKER]`. Include at least two other unique markers like `[IN_CONTENT_IMAGE_1_MARKER]`.
-    **Output:** Respond ONLY with a single, valid JSON object with `outline` and `image_plan` keys.
-    """
-    strategic_angle = config.get('article_idea', {}).get('azlo_strategic_angle')
-    strategic_instruction = f"CRITICAL INSTRUCTION: Weave this strategic angle throughout the content:\n---\n{strategic_angle}\n---" if strategic_angle else ""
-    prompt = f"{base_prompt}\n{strategic_instruction}\nFull Article Configuration:\n---\n{yaml.dump(config['article_idea'])}\n---"
 
-    try:
-        response = model.generate_content(prompt)
-        cleaned_response_text = re.sub(r'```json\n?|```', '', response.text).strip()
-        plan = json.loads(cleaned_response_text)
+    prompt = build_prompt('plan', get_plan_generation_prompt, config['article_idea'])
+
+    def parse_plan(text: str) -> dict:
+        plan = parse_json_response(text)
         if "outline" not in plan or "image_plan" not in plan:
             raise ValueError("Generated plan is missing 'outline' or 'image_plan'.")
+        return plan
+
+    try:
+        plan = call_text_model(model_name, prompt, parse_plan, stage='plan')
         logging.info("Outline and image plan generated successfully.")
         return plan
     except Exception as e:
         logging.error(f"Error generating plan: {e}", exc_info=True)
         raise
 
+def build_article_prompt(plan: dict) -> str:
+    """Build the article-writing prompt for a plan."""
+    return build_prompt('article', get_article_generation_prompt, plan)
+
 def generate_article_text(plan: dict) -> str:
     """Generate article markdown content."""
     # --- USES CONFIG ---
     model_name = CONFIG['models']['text_model_name']
     logging.info(f"Generating article Markdown using '{model_name}'...")
-    model = GenerativeModel(model_name)
-
-    prompt = f"""
-    You are a senior tech writer for Azlo.pro. Write a complete blog post in GitHub Flavored Markdown based *exactly* on the provided JSON plan.
-    **CRITICAL RULES:**
-    1.  **No Main Title:** Do NOT write a main H1 title ('#').
-    2.  **Start with Featured Image:** The response MUST start with the featured image's `placement_marker`.
-    3.  **Summary Next:** After the marker, write the `summary` as plain text (no blockquotes).
-    4.  **Structure:** Use '---' after the summary, H3 ('###') for the intro heading, and H2 ('##') for section titles.
-    5.  **Place Markers:** You MUST insert the *exact* `placement_marker` strings (e.g., `[IN_CONTENT_IMAGE_1_MARKER]`) from the plan where visuals are needed. DO NOT generate Hugo shortcodes like `{{{{< figure >}}}}`.
-    **Article Plan (Your Source of Truth):**
-    ---
-    {json.dumps(plan, indent=2)}
-    ---
-    """
+    prompt = build_article_prompt(plan)
     try:
-        response = model.generate_content(prompt)
+        article_markdown = call_text_model(model_name, prompt, stage='article')
         logging.info("Article Markdown generated successfully.")
-        return response.text
+        return article_markdown
     except Exception as e:
         logging.error(f"Failed to generate article text: {e}", exc_info=True)
         raise
 
 def generate_single_image_api_call(prompt: str, output_path: str) -> bool:
-    """Generate a single image using Vertex AI with retry logic from config."""
+    """Generate a single image using Vertex AI, retrying quota errors and timeouts through the governor."""
     # --- USES CONFIG ---
-    gcp_project_id = CONFIG['vertex_ai']['gcp_project_id']
-    gcp_location = CONFIG['vertex_ai']['gcp_location']
     model_name = CONFIG['models']['image_model_name']
-    max_retries = CONFIG['api']['max_retries']
-    initial_backoff = CONFIG['api']['initial_backoff_seconds']
 
-    for attempt in range(max_retries):
+    cached = IMAGE_CACHE.get_image(model_name, prompt) if IMAGE_CACHE else None
+    if cached is not None:
+        write_atomic(cached, Path(output_path))
+        logging.info(f"♻️  Image cache hit for '{prompt[:50]}...', saved to {output_path}")
+        return True
+
+    # One metrics event covers every attempt; `status` marks how the call ended
+    with METRICS.timed('api', 'image', model=model_name, prompt_chars=len(prompt),
+                       retries=0, backoff_seconds=0.0, queue_seconds=0.0) as call:
         try:
-            logging.info(f"Requesting image (Attempt {attempt + 1}/{max_retries}): '{prompt[:50]}...'")
-            model = ImageGenerationModel.from_pretrained(model_name)
-            response = model.generate_images(prompt=prompt, number_of_images=1)
-            response[0].save(location=output_path, include_generation_parameters=True)
-
-            with Image.open(output_path) as img:
-                if img.mode in ("RGBA", "P"):
-                    img = img.convert("RGB")
-                img.save(output_path, "JPEG", quality=85)
+            logging.info(f"Requesting image: '{prompt[:50]}...'")
+            image_bytes = GOVERNOR.call(
+                model_name, lambda slot: DEADLINES.run('image', lambda: BACKEND.generate_image(model_name, prompt),
+                                                       stats=call, on_abandon=slot.hold),
+                call)
+            # Decode and re-encode once in memory, then write the final file directly
+            encode_started = time.perf_counter()
+            jpeg_bytes = encode_jpeg(image_bytes, quality=85)
+            write_atomic(jpeg_bytes, Path(output_path))
+            call.update(encode_seconds=time.perf_counter() - encode_started, response_bytes=len(image_bytes))
+            if IMAGE_CACHE:
+                IMAGE_CACHE.put_image(model_name, prompt, jpeg_bytes)
             logging.info(f"Successfully generated and saved image to {output_path}")
             return True
-        except exceptions.ResourceExhausted as e:
-            logging.warning(f"Quota exceeded. Retrying after delay...")
-            if attempt < max_retries - 1:
-                delay = initial_backoff * (2 ** attempt)
-                time.sleep(delay)
-            else:
-                logging.error(f"Image generation failed after {max_retries} attempts: {e}")
-                return False
         except Exception as e:
-            logging.error(f"Unexpected error during image generation: {e}", exc_info=True)
+            if is_quota_error(e):
+                logging.error(f"Image generation failed after {GOVERNOR.max_retries} attempts: {e}")
+                call['status'] = 'quota_exhausted'
+            elif isinstance(e, TimeoutError):
+                logging.error(f"Image generation timed out on all {GOVERNOR.max_retries} attempts: {e}")
+                call['status'] = 'timeout'
+            else:
+                logging.error(f"Unexpected error during image generation: {e}", exc_info=True)
+                call['status'] = type(e).__name__
             return False
-    return False
-
-def generate_images(plan: dict) -> dict:
-    """Generate all images for the blog post."""
-    logging.info("Generating images...")
-    image_filepaths = {}
-    # --- USES CONFIG ---
-    temp_dir = Path(CONFIG['paths']['temp_image_dir'])
-    api_call_delay = CONFIG['api']['call_delay_seconds']
-    temp_dir.mkdir(exist_ok=True)
 
-    # Create stable filenames
+def image_filename_map(plan: dict) -> Dict[str, str]:
+    """Map each placement marker in the plan to its stable bundle filename."""
     filename_map, in_content_count = {}, 1
     markers = [spec['placement_marker'] for spec in plan['image_plan']]
     featured_marker = next((m for m in markers if "featured" in m.lower()), None)
     if featured_marker:
         filename_map[featured_marker] = "featured_image.jpg"
     for marker in (m for m in markers if m != featured_marker):
-        filename_map[marker] = f"image_{in_content_count}.jpg"
-        in_content_count += 1
+        if marker not in filename_map:
+            filename_map[marker] = f"image_{in_content_count}.jpg"
+            in_content_count += 1
+    return filename_map
 
-    for i, image_spec in enumerate(plan['image_plan']):
+def submit_variants(image_path: Path) -> Optional[Future]:
+    """Queue responsive variants of an image on the process pool, if enabled, and return the job."""
+    if VARIANT_POOL is None:
+        return None
+    variant_config = CONFIG.get('images', {}).get('variants', {})
+    future = VARIANT_POOL.submit(render_variants, str(image_path), variant_config.get('widths', [480, 960]),
+                                 variant_config.get('formats', ['webp', 'jpeg']), variant_config.get('quality', 80))
+
+    def finished(done: Future):
+        VARIANT_FUTURES.discard(done)
+        if done.exception():
+            logging.error(f"Failed to render variants of {image_path}: {done.exception()}")
+
+    VARIANT_FUTURES.add(future)
+    future.add_done_callback(finished)
+    return future
+
+def generate_images(plan: dict, image_dir: Path, done: Optional[Dict[str, str]] = None,
+                    on_image: Optional[Callable[[str, str], None]] = None,
+                    variant_jobs: Optional[List[Future]] = None) -> dict:
+    """Generate all images for the blog post straight into `image_dir` (the bundle).
+
+    The featured image is hardlinked to og_image.jpg as soon as it is written.
+    Markers in `done` whose file still exists are reused instead of re-rendered.
+    `on_image(marker, path)` is called as each image lands on disk, and the
+    responsive variant jobs queued for them are added to `variant_jobs`.
+    """
+    logging.info("Generating images...")
+    image_filepaths = {}
+    image_dir.mkdir(parents=True, exist_ok=True)
+
+    filename_map = image_filename_map(plan)
+    featured_marker = next((m for m in filename_map if "featured" in m.lower()), None)
+    # A marker repeated in the plan maps to one file; as in the old sequential loop, its last spec wins
+    specs = list({spec['placement_marker']: spec for spec in plan['image_plan']}.values())
+
+    def render(i: int, image_spec: dict) -> str:
         marker, prompt = image_spec['placement_marker'], image_spec['generation_prompt']
-        filename = filename_map.get(marker, f"image_extra_{i}.jpg")
-        output_path = temp_dir / filename
-        logging.info(f"Processing image {i+1}/{len(plan['image_plan'])} ('{filename}')...")
+        filename = filename_map[marker]
+        output_path = image_dir / filename
+        if done and marker in done and Path(done[marker]).exists():
+            logging.info(f"Reusing image {i+1}/{len(specs)} ('{done[marker]}') from a previous run.")
+            return done[marker]
+        logging.info(f"Processing image {i+1}/{len(specs)} ('{filename}')...")
         if not generate_single_image_api_call(prompt, str(output_path)):
             logging.warning(f"API failed. Creating placeholder for '{filename}'.")
             create_placeholder_image(prompt, str(output_path))
-        image_filepaths[marker] = str(output_path)
-        if i < len(plan['image_plan']) - 1:
-            logging.info(f"Waiting {api_call_delay} seconds...")
-            time.sleep(api_call_delay)
+        if marker == featured_marker:
+            link_or_copy(output_path, image_dir / "og_image.jpg")
+        job = submit_variants(output_path)
+        if job is not None and variant_jobs is not None:
+            variant_jobs.append(job)
+        if on_image:
+            on_image(marker, str(output_path))
+        return str(output_path)
+
+    # Each image succeeds or falls back to its placeholder independently;
+    # the shared rate limiter still paces the actual API calls.
+    max_workers = max(1, min(CONFIG['api'].get('image_concurrency', 1), len(specs)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image") as pool:
+        futures = [(spec['placement_marker'], pool.submit(render, i, spec)) for i, spec in enumerate(specs)]
+        for marker, future in futures:
+            image_filepaths[marker] = future.result()
     return image_filepaths
 
-def assemble_bundle(hugo_path: str, article_idea: dict, plan: dict, article_md: str, image_paths: dict):
-    """Assemble the Hugo page bundle."""
+def build_front_matter(title: str, article_idea: dict, plan: dict, featured_filename: Optional[str],
+                       date: Optional[str] = None) -> dict:
+    """Build the Hugo front matter for a post, dated now unless an existing `date` is kept."""
+    front_matter = {'title': title, 'date': date or datetime.now().astimezone().isoformat(), 'summary': plan['outline'].get('summary'), 'keywords': article_idea.get('keywords', [])}
+    if featured_filename:
+        front_matter['image'] = featured_filename
+        front_matter['og_image'] = "og_image.jpg"
+    return front_matter
+
+def render_front_matter(front_matter: dict) -> str:
+    """Render front matter as a YAML block between --- fences."""
+    return "---\n" + yaml.dump(front_matter, allow_unicode=True, sort_keys=False) + "---\n"
+
+def split_front_matter(text: str) -> Tuple[dict, str]:
+    """Split a page into its front matter and body (empty front matter if it has none)."""
+    if text.startswith("---\n"):
+        end = text.find("\n---\n", 3)
+        if end != -1:
+            return yaml.safe_load(text[4:end]) or {}, text[end + 5:]
+    return {}, text
+
+def figure_replacements(plan: dict, filenames: Dict[str, str]) -> Dict[str, str]:
+    """Map each marker with a known filename to its Hugo figure shortcode."""
+    alt_texts = {spec['placement_marker']: spec.get('alt_text', "") for spec in plan['image_plan']}
+    return {marker: f'\n\n{{{{< figure src="{filename}" alt="{alt_texts.get(marker, "")}" >}}}}\n\n'
+            for marker, filename in filenames.items()}
+
+def create_bundle_dir(hugo_path: str, title: str) -> Path:
+    """Create a fresh, uniquely named page bundle directory for `title`, hidden until it is published.
+
+    The directory is `.<slug>-<timestamp>`, which Hugo skips, so a title that
+    fails halfway never puts its images on the site. publish_bundle_dir()
+    renames it into place once index.md is written.
+    """
+    unique_slug = f"{slugify(title)}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    name = unique_slug
+    Path(hugo_path).mkdir(parents=True, exist_ok=True)
+    # Concurrent titles can land on the same slug within the same second
+    suffix = 1
+    while True:
+        bundle_path = Path(hugo_path) / f".{name}"
+        try:
+            if not (Path(hugo_path) / name).exists():
+                bundle_path.mkdir()
+                break
+        except FileExistsError:
+            pass
+        suffix += 1
+        name = f"{unique_slug}-{suffix}"
+    logging.info(f"Created bundle directory: {bundle_path}")
+    return bundle_path
+
+def published_bundle_path(bundle_path: Path) -> Path:
+    """Where a bundle directory ends up once published (the same path if it is not hidden)."""
+    bundle_path = Path(bundle_path)
+    return bundle_path.with_name(bundle_path.name.lstrip('.'))
+
+def publish_bundle_dir(bundle_path: Path) -> Path:
+    """Rename a finished bundle out of its hidden staging directory and return where it now lives."""
+    published = published_bundle_path(bundle_path)
+    if published != Path(bundle_path):
+        os.rename(bundle_path, published)
+        logging.info(f"Published bundle directory: {published}")
+    return published
+
+def assemble_bundle(bundle_path: Path, article_idea: dict, plan: dict, article_md: str, image_paths: dict,
+                    date: Optional[str] = None) -> Path:
+    """Assemble the Hugo page bundle and return its directory.
+
+    Images are normally already written into `bundle_path`; any that live
+    elsewhere (e.g. from an older resumed run) are moved in. `date` keeps the
+    publication date of a bundle that is being rebuilt.
+    """
     logging.info("Assembling Hugo Page Bundle...")
     title = plan['outline'].get('title', article_idea.get('title', 'Untitled Post'))
-    unique_slug = f"{slugify(title)}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
-    bundle_path = Path(hugo_path) / unique_slug
+    bundle_path = Path(bundle_path)
     bundle_path.mkdir(parents=True, exist_ok=True)
-    logging.info(f"Created bundle directory: {bundle_path}")
 
-    # Move images and update paths
     final_image_paths = {}
-    for marker, temp_path_str in image_paths.items():
-        temp_path = Path(temp_path_str)
-        if temp_path.exists():
-            dest_path = bundle_path / temp_path.name
-            shutil.move(str(temp_path), str(dest_path))
-            final_image_paths[marker] = temp_path.name
-
-    # Clean up temp directory
-    temp_dir = Path(CONFIG['paths']['temp_image_dir'])
-    if temp_dir.exists() and not any(temp_dir.iterdir()):
-        shutil.rmtree(temp_dir)
+    for marker, image_path_str in image_paths.items():
+        image_path = Path(image_path_str)
+        if image_path.parent.resolve() != bundle_path.resolve() and image_path.exists():
+            shutil.move(str(image_path), str(bundle_path / image_path.name))
+        if (bundle_path / image_path.name).exists():
+            final_image_paths[marker] = image_path.name
 
     # Create front matter
     featured_filename = next((name for marker, name in final_image_paths.items() if "featured" in marker.lower()), None)
-    front_matter = {'title': title, 'date': datetime.now().astimezone().isoformat(), 'summary': plan['outline'].get('summary'), 'keywords': article_idea.get('keywords', [])}
+    front_matter = build_front_matter(title, article_idea, plan, featured_filename, date)
     if featured_filename:
-        front_matter['image'] = featured_filename
         try:
-            shutil.copyfile(bundle_path / featured_filename, bundle_path / "og_image.jpg")
-            front_matter['og_image'] = "og_image.jpg"
+            if not (bundle_path / "og_image.jpg").exists():
+                link_or_copy(bundle_path / featured_filename, bundle_path / "og_image.jpg")
         except Exception as e:
             logging.error(f"Error creating OG image: {e}")
+            front_matter.pop('og_image')
 
-    # Replace markers with Hugo shortcodes
-    content_with_figures = article_md
-    for marker, filename in final_image_paths.items():
-        alt_text = next((s['alt_text'] for s in plan['image_plan'] if s['placement_marker'] == marker), "")
-        hugo_shortcode = f'\n\n{{{{< figure src="{filename}" alt="{alt_text}" >}}}}\n\n'
-        content_with_figures = content_with_figures.replace(marker, hugo_shortcode)
+    # Replace markers with Hugo shortcodes in a single pass
+    content_with_figures = MarkerReplacer(figure_replacements(plan, final_image_paths)).replace_all(article_md)
 
     # Write index.md
-    with open(bundle_path / "index.md", 'w', encoding='utf-8') as f:
-        f.write("---\n")
-        yaml.dump(front_matter, f, allow_unicode=True, sort_keys=False)
-        f.write("---\n")
-        f.write(content_with_figures)
+    with AtomicTextWriter(bundle_path / "index.md") as writer:
+        writer.write(render_front_matter(front_matter))
+        writer.write(content_with_figures)
     logging.info(f"Successfully created {bundle_path / 'index.md'}")
+    return bundle_path
 
-# --- UPDATED: Process Single Title with Loading Spinner ---
-def process_single_title(title: str, hugo_posts_path: str):
-    """Process a single blog title through the entire pipeline with loading visuals."""
+def stream_article_to_bundle(bundle_path: Path, article_idea: dict, plan: dict) -> Tuple[Path, Path]:
+    """Stream the article from the model straight into the bundle's index.md.
+
+    Markers are swapped for figure shortcodes as chunks arrive, using the
+    filenames the image stage will write. The file stays a hidden partial
+    until finalize_streamed_bundle renames it, so Hugo never sees a half
+    written post. The chunks are also teed, markers included, to the
+    bundle's ARTICLE_SOURCE_NAME for its record, so the article is never
+    held in memory. Returns the partial file's path and the source file's.
+    """
+    model_name = CONFIG['models']['text_model_name']
+    logging.info(f"Streaming article Markdown using '{model_name}'...")
+    title = plan['outline'].get('title', article_idea.get('title', 'Untitled Post'))
+    filename_map = image_filename_map(plan)
+    featured_filename = next((name for marker, name in filename_map.items() if "featured" in marker.lower()), None)
+    replacer = MarkerReplacer(figure_replacements(plan, filename_map))
+
+    started = time.monotonic()
+    first_chunk_at = None
+    source_path = Path(bundle_path) / ARTICLE_SOURCE_NAME
+    with AtomicTextWriter(Path(bundle_path) / "index.md", keep_partial=True) as writer, \
+            AtomicTextWriter(source_path) as source:
+        writer.write(render_front_matter(build_front_matter(title, article_idea, plan, featured_filename)))
+        for chunk in stream_text_model(model_name, build_article_prompt(plan), stage='article'):
+            if first_chunk_at is None:
+                first_chunk_at = time.monotonic() - started
+            source.write(chunk)
+            writer.write(replacer.feed(chunk))
+        writer.write(replacer.flush())
+    logging.info(f"Article streamed to disk ({writer.bytes_written} chars, first chunk after "
+                 f"{first_chunk_at or 0:.2f}s, done after {time.monotonic() - started:.2f}s).")
+    return writer.partial_path, source_path
+
+def finalize_streamed_bundle(bundle_path: Path, plan: dict) -> Path:
+    """Publish a bundle whose index.md was streamed, once its images are in place."""
+    bundle_path = Path(bundle_path)
+    missing = [name for name in image_filename_map(plan).values() if not (bundle_path / name).exists()]
+    if missing:
+        logging.warning(f"Streamed article references missing image(s): {', '.join(missing)}")
+    commit_partial(bundle_path / "index.md")
+    logging.info(f"Successfully created {bundle_path / 'index.md'}")
+    return bundle_path
+
+# --- Bundle Records ---
+# What a bundle was built from is kept beside its index.md, so its images or page can be
+# rebuilt later without re-running the text stages. Hugo skips dot-files in content.
+BUNDLE_RECORD_NAME = ".generator.json"
+BUNDLE_RECORD_VERSION = 1
+# A streamed article's Markdown is kept in this file rather than inside the record
+ARTICLE_SOURCE_NAME = ".article.md"
+
+def current_models() -> Dict[str, Optional[str]]:
+    """The configured model behind each part of a bundle, as stored in its record."""
+    models = CONFIG.get('models', {})
+    return {'config': models.get('config_generation_model'), 'text': models.get('text_model_name'),
+            'image': models.get('image_model_name')}
+
+def write_bundle_record(bundle_path: Path, title: str, article_idea: dict, plan: dict, article_md: Optional[str],
+                        article_file: Optional[str] = None, models: Optional[Dict[str, Optional[str]]] = None):
+    """Store the config, plan (with its image prompts), article Markdown and models behind a bundle.
+
+    `article_file` names a file in the bundle holding the Markdown instead of
+    `article_md`. `models` defaults to the configured ones.
+    """
+    record = {
+        'version': BUNDLE_RECORD_VERSION,
+        'title': title,
+        'models': models if models is not None else current_models(),
+        'article_idea': article_idea,
+        'plan': plan,
+        # As the model wrote it: image markers rather than figure shortcodes
+        'article_markdown': article_md,
+        'article_file': article_file,
+        'updated': datetime.now().astimezone().isoformat(),
+    }
+    write_atomic(json.dumps(record, ensure_ascii=False, indent=1).encode('utf-8'),
+                 Path(bundle_path) / BUNDLE_RECORD_NAME)
+
+def read_bundle_record(bundle_path: Path) -> Optional[dict]:
+    """The bundle's record, or None if it has none (or an unreadable one)."""
     try:
-        call_delay = CONFIG['api']['call_delay_seconds']
+        with open(Path(bundle_path) / BUNDLE_RECORD_NAME, 'r', encoding='utf-8') as f:
+            record = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return record if record.get('version') == BUNDLE_RECORD_VERSION else None
+
+def read_recorded_article(bundle_path: Path, record: dict) -> Optional[str]:
+    """The article Markdown a record holds, whether inline or in its article file."""
+    if record.get('article_markdown') is not None or not record.get('article_file'):
+        return record.get('article_markdown')
+    try:
+        return (Path(bundle_path) / record['article_file']).read_text(encoding='utf-8')
+    except OSError:
+        return None
+
+def recorded_title_slug(bundle_path: Path) -> Optional[str]:
+    """Slug of the CSV title a bundle was generated for, from its record (None without one)."""
+    record = read_bundle_record(bundle_path)
+    return slugify(record['title']) if record and record.get('title') else None
+
+def scan_bundle_index(hugo_path: str) -> BundleIndex:
+    """Index the published bundles by directory name and by the title each was generated for."""
+    return BundleIndex.scan(hugo_path, recorded_title_slug)
+
+# --- Pipeline Stages ---
+# Human-readable labels for the spinner/log, in pipeline order
+STAGE_LABELS = {
+    'config': "Step 1/5: Generating strategic configuration",
+    'plan': "Step 2/5: Creating article outline and image plan",
+    'bundle_dir': "Preparing page bundle directory",
+    'article': "Step 3/5: Writing article Markdown",
+    'images': "Step 4/5: Generating all images",
+    'bundle': "Step 5/5: Assembling Hugo page bundle",
+}
 
-        with LoadingSpinner("Step 1/5: Generating strategic configuration..."):
-            article_idea = generate_blog_config(title)
-        if not article_idea:
-            raise ValueError("Failed to generate article idea config.")
+def build_title_graph(title: str, hugo_posts_path: str, journal: Optional[RunJournal] = None,
+                      on_bundle_dir: Optional[Callable[[Path], None]] = None,
+                      variant_jobs: Optional[List[Future]] = None) -> StageGraph:
+    """Express one title's pipeline as a stage graph.
+
+    Article text and images both depend only on the plan and the bundle
+    directory, so they run concurrently and the bundle is assembled as soon as
+    both are ready. In streaming mode the article is written into the bundle
+    as it arrives. With a journal, stages finished by an earlier run
+    are reused instead of re-run. `on_bundle_dir` is told the (still hidden)
+    bundle directory as soon as it is known. The responsive variant jobs
+    queued for the images are added to `variant_jobs`; the bundle stage
+    waits for them before publishing the directory.
+    """
+    done = journal.stages(title) if journal else {}
+    streaming = CONFIG.get('streaming', {}).get('enabled', False)
+    variant_jobs = variant_jobs if variant_jobs is not None else []
+
+    def record(stage: str, output: Any):
+        if journal:
+            journal.record(title, stage, output)
+
+    def journaled(stage: str, produce: Callable[[], Any]) -> Any:
+        if stage in done:
+            logging.info(f"{STAGE_LABELS[stage]}: reusing result from journal.")
+            return done[stage]
+        output = produce()
+        record(stage, output)
+        return output
+
+    def config_stage() -> dict:
+        def produce():
+            article_idea = get_blog_config(title)
+            if not article_idea:
+                raise ValueError("Failed to generate article idea config.")
+            return article_idea
+        return journaled('config', produce)
+
+    def plan_stage(article_idea: dict) -> dict:
         full_config = {'article_idea': article_idea, 'hugo_posts_path': hugo_posts_path}
-        time.sleep(call_delay)
+        return journaled('plan', lambda: generate_plan(full_config))
 
-        with LoadingSpinner("Step 2/5: Creating article outline and image plan..."):
-            plan = generate_plan(full_config)
-        time.sleep(call_delay)
+    def bundle_dir_stage(article_idea: dict, plan: dict) -> Path:
+        # Images are written straight into the bundle, so it is created up front
+        bundle_title = plan['outline'].get('title', article_idea.get('title', 'Untitled Post'))
+        bundle_path = Path(journaled('bundle_dir', lambda: str(create_bundle_dir(hugo_posts_path, bundle_title))))
+        if on_bundle_dir is not None:
+            on_bundle_dir(bundle_path)
+        return bundle_path
 
-        with LoadingSpinner("Step 3/5: Writing article Markdown..."):
-            article_markdown = generate_article_text(plan)
-        time.sleep(call_delay)
+    def article_stage(article_idea: dict, plan: dict, bundle_path: Path) -> Any:
+        if streaming:
+            streamed = done.get('article')
+            if isinstance(streamed, dict) and Path(streamed['streamed_to']).exists():
+                logging.info(f"{STAGE_LABELS['article']}: reusing streamed file from journal.")
+                return streamed
+            if not isinstance(streamed, str):
+                partial_path, source_path = stream_article_to_bundle(bundle_path, article_idea, plan)
+                output = {'streamed_to': str(partial_path), 'source': str(source_path)}
+                record('article', output)
+                return output
+        return journaled('article', lambda: generate_article_text(plan))
 
-        # The generate_images function logs its own progress for each image,
-        # which will appear below the main spinner line.
-        with LoadingSpinner("Step 4/5: Generating all images..."):
-            image_filenames = generate_images(plan)
+    def images_stage(plan: dict, bundle_path: Path) -> dict:
+        return generate_images(plan, bundle_path, done=done.get('image'),
+                               on_image=lambda marker, path: record('image', {'marker': marker, 'path': path}),
+                               variant_jobs=variant_jobs)
+
+    def bundle_stage(article_idea: dict, plan: dict, bundle_path: Path, article: Any, image_filenames: dict) -> Path:
+        # Written before index.md is published, so every published bundle can be regenerated
+        if isinstance(article, dict):
+            source = Path(article['source']).name if article.get('source') else None
+            write_bundle_record(bundle_path, title, article_idea, plan, article.get('markdown'), source)
+        else:
+            write_bundle_record(bundle_path, title, article_idea, plan, article)
+        if isinstance(article, dict):
+            bundle_path = finalize_streamed_bundle(bundle_path, plan)
+        else:
+            bundle_path = assemble_bundle(bundle_path, article_idea, plan, article, image_filenames)
+        # Variants are written next to their images, so they must land before the directory moves
+        wait(variant_jobs)
+        bundle_path = publish_bundle_dir(bundle_path)
+        record('bundle', str(bundle_path))
+        if BUNDLE_INDEX is not None:
+            BUNDLE_INDEX.add_bundle(bundle_path)
+            BUNDLE_INDEX.add(slugify(title))
+        return bundle_path
+
+    def timed(stage: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        def run(*results):
+            with METRICS.timed('stage', stage, title=title, reused=stage in done):
+                return fn(*results)
+        return run
+
+    graph = StageGraph()
+    graph.add('config', timed('config', config_stage))
+    graph.add('plan', timed('plan', plan_stage), deps=['config'])
+    graph.add('bundle_dir', timed('bundle_dir', bundle_dir_stage), deps=['config', 'plan'])
+    graph.add('article', timed('article', article_stage), deps=['config', 'plan', 'bundle_dir'])
+    graph.add('images', timed('images', images_stage), deps=['plan', 'bundle_dir'])
+    graph.add('bundle', timed('bundle', bundle_stage), deps=['config', 'plan', 'bundle_dir', 'article', 'images'])
+    return graph
+
+# --- UPDATED: Process Single Title with Loading Spinner ---
+def process_single_title(title: str, hugo_posts_path: str, show_spinner: bool = True,
+                         journal: Optional[RunJournal] = None, submitted_at: Optional[float] = None,
+                         on_bundle_dir: Optional[Callable[[Path], None]] = None):
+    """Process a single blog title through the entire pipeline with loading visuals.
+
+    With a journal, stages finished by an earlier run are reused and the title
+    resumes at its first incomplete stage. Without one nothing will resume a
+    failed title, so its unpublished bundle directory is removed.
+    `submitted_at` (a perf_counter reading) lets the time spent waiting for a
+    worker be recorded as `queued`.
+    """
+    started = time.perf_counter()
+    if submitted_at is not None:
+        METRICS.record('stage', 'queued', started - submitted_at, title=title, status='ok')
+    bundle_dirs: List[Path] = []
+    variant_jobs: List[Future] = []
 
-        with LoadingSpinner("Step 5/5: Assembling Hugo page bundle..."):
-            assemble_bundle(hugo_posts_path, article_idea, plan, article_markdown, image_filenames)
+    def found_bundle_dir(path: Path):
+        bundle_dirs.append(path)
+        if on_bundle_dir is not None:
+            on_bundle_dir(path)
+
+    try:
+        graph = build_title_graph(title, hugo_posts_path, journal, found_bundle_dir, variant_jobs)
+        running: List[str] = []
+        with LoadingSpinner("Starting pipeline...", enabled=show_spinner) as spinner:
+            # The spinner line always shows every stage currently in flight
+            def on_start(stage: str):
+                running.append(stage)
+                spinner.update(" + ".join(STAGE_LABELS[name] for name in running) + "...")
+
+            def on_finish(stage: str):
+                running.remove(stage)
+
+            graph.run(on_start=on_start, on_finish=on_finish)
 
         logging.info(f"✅ Successfully processed: {title}")
+        METRICS.record('stage', 'title', time.perf_counter() - started, title=title, status='ok')
         return True
     except Exception as e:
         logging.error(f"❌ Failed to process '{title}': {e}", exc_info=True)
+        METRICS.record('stage', 'title', time.perf_counter() - started, title=title, status=type(e).__name__)
+        if journal is None:
+            wait(variant_jobs)
+            for path in bundle_dirs:
+                if path != published_bundle_path(path) and path.is_dir():
+                    logging.info(f"🧹 Removing the unpublished bundle directory {path}")
+                    shutil.rmtree(path, ignore_errors=True)
         return False
 
-def load_titles_from_csv(csv_path: str) -> List[str]:
-    """Load titles from CSV file, assuming title is in the first column."""
-    titles = []
+def bundle_dir_in(hugo_posts_path: str, name: Optional[str]) -> Optional[Path]:
+    """The bundle directory `name` resolved inside `hugo_posts_path`, or None if it would point anywhere else."""
+    if not name:
+        return None
+    # Queue files written before names were stored hold a whole path; only its last part is trusted
+    name = Path(name).name
+    posts = Path(hugo_posts_path).resolve()
+    bundle_path = (posts / name).resolve()
+    if name in ('', '.', '..') or bundle_path.parent != posts:
+        logging.warning(f"Ignoring bundle directory '{name}' recorded in the queue: it is not inside {posts}")
+        return None
+    return Path(hugo_posts_path) / name
+
+def process_queued_title(queue: WorkQueue, worker_id: str, title: str, hugo_posts_path: str,
+                         show_spinner: bool = True, submitted_at: Optional[float] = None) -> bool:
+    """Process a title claimed from the work queue and mark it done or failed there.
+
+    The bundle directory's name is stored in the queue as soon as it is
+    created. If an earlier claim (by a worker that crashed) left one behind,
+    a published bundle there completes the title and an unfinished one is
+    deleted, so its stray files do not pile up under the Hugo path. The name
+    is resolved against this worker's `hugo_posts_path`, and only a
+    directory directly inside it is ever removed.
+    """
+    previous = bundle_dir_in(hugo_posts_path, queue.bundle_dir(title))
+    if previous is not None:
+        published = published_bundle_path(previous)
+        if (published / "index.md").exists():
+            logging.info(f"♻️  '{title}' was already published to {published} by an earlier claim.")
+            queue.complete(title, worker_id)
+            return True
+        if previous.is_dir():
+            logging.warning(f"🧹 Removing the unfinished bundle an earlier claim of '{title}' left at {previous}")
+            shutil.rmtree(previous, ignore_errors=True)
+
+    succeeded = process_single_title(title, hugo_posts_path, show_spinner, None, submitted_at,
+                                     on_bundle_dir=lambda path: queue.set_bundle_dir(title, worker_id, path.name))
+    if succeeded:
+        queue.complete(title, worker_id)
+    else:
+        queue.fail(title, worker_id, f"Pipeline failed on worker {worker_id}; see its log.")
+    return succeeded
+
+def iter_titles_from_csv(csv_path: str) -> Iterator[str]:
+    """Yield titles from a CSV file one row at a time, assuming title is in the first column."""
+    count = 0
     try:
         with open(csv_path, 'r', encoding='utf-8-sig') as f:
             reader = csv.reader(f)
             next(reader, None)  # Skip header
             for row in reader:
                 if row and row[0].strip():
-                    titles.append(row[0].strip())
-        logging.info(f"Loaded {len(titles)} titles from {csv_path}")
-        return titles
+                    count += 1
+                    yield row[0].strip()
+        logging.info(f"Read {count} titles from {csv_path}")
     except FileNotFoundError:
         logging.error(f"CSV file not found: {csv_path}")
-        return []
     except Exception as e:
         logging.error(f"Error reading CSV {csv_path}: {e}")
-        return []
 
-def main():
-    """Main function to run the blog generation process."""
+def load_titles_from_csv(csv_path: str) -> List[str]:
+    """Load all titles from a CSV file into a list."""
+    return list(iter_titles_from_csv(csv_path))
+
+def iter_pending_titles(titles: Iterable[str], journal: Optional[RunJournal] = None,
+                        index: Optional[BundleIndex] = None, counts: Optional[Counter] = None) -> Iterator[str]:
+    """Yield the titles that still need generating, lazily.
+
+    Skips repeats of a title earlier in the same CSV, titles the journal marks
+    as done and titles whose slug already has a published bundle. `counts`
+    tallies every title read and each reason for skipping one.
+    """
+    counts = Counter() if counts is None else counts
+    seen = set()
+    for title in titles:
+        counts['read'] += 1
+        slug = slugify(title)
+        if slug in seen:
+            counts['duplicate'] += 1
+            logging.info(f"⏭️  Skipping duplicate title: {title}")
+            continue
+        seen.add(slug)
+        if journal and journal.is_done(title):
+            counts['journal'] += 1
+        elif index is not None and slug in index:
+            counts['published'] += 1
+            logging.info(f"⏭️  Skipping already published title: {title}")
+        else:
+            yield title
+
+def read_ahead(items: Iterable[str], count: int, on_read: Callable[[str], None]) -> Iterator[str]:
+    """Yield `items` unchanged while keeping `count` of them read in advance.
+
+    `on_read` sees each item as soon as it is read, e.g. to queue titles for
+    a batched request before their turn comes.
+    """
+    buffer: Deque[str] = deque()
+    for item in items:
+        on_read(item)
+        buffer.append(item)
+        if len(buffer) > count:
+            yield buffer.popleft()
+    while buffer:
+        yield buffer.popleft()
+
+def batch_ahead(titles: Iterator[str], batch_size: int, journal: Optional[RunJournal] = None) -> Iterator[str]:
+    """Read `batch_size` titles ahead so their configs can share a request, when batching is on."""
+    if CONFIG_BATCHER is None:
+        return titles
+
+    def queue_for_batch(title: str):
+        if not (journal and 'config' in journal.stages(title)):
+            CONFIG_BATCHER.prime([title])
+
+    # Titles are batched in CSV order, matching the order the workers pick them up
+    return read_ahead(titles, batch_size, queue_for_batch)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line arguments. Unset options fall back to config.yaml in apply_config_defaults()."""
+    parser = argparse.ArgumentParser(description="CSV Blog Generator for Hugo",
+                                     epilog="Quick commands: 'main.py pending [csv]' lists titles still to do, "
+                                            "'main.py validate [csv]' checks the CSV and config, "
+                                            "'main.py queue' shows a shared work queue's progress, "
+                                            "'main.py regenerate --only images|text|front-matter' rebuilds "
+                                            "parts of existing bundles, 'main.py daemon' watches a spool directory.")
+    parser.add_argument("csv_path", nargs="?",
+                        help="CSV file with one title per row (default from config.yaml)")
+    parser.add_argument("hugo_path", nargs="?",
+                        help="Hugo content/posts directory (default from config.yaml)")
+    parser.add_argument("--config", default="config.yaml", help="Path to the configuration file")
+    parser.add_argument("--concurrency", type=int,
+                        help="Number of titles to run through the pipeline at the same time")
+    parser.add_argument("--config-batch-size", type=int,
+                        help="Generate configs for this many titles per request (1 disables batching)")
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument("--no-cache", action="store_true",
+                             help="Neither read nor write the on-disk response and image caches")
+    cache_group.add_argument("--refresh", action="store_true",
+                             help="Ignore cached responses and images but store the fresh ones")
+    parser.add_argument("--backend", choices=["vertex", "fake"],
+                        help="Model backend; 'fake' runs fully offline with canned responses")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream article text straight into index.md as it is generated")
+    parser.add_argument("--queue", metavar="PATH",
+                        help="Share the titles through this SQLite work queue so several workers can drain them")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Ignore the run journal next to the CSV and existing bundles, and regenerate every title")
+    args = parser.parse_args(argv)
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.config_batch_size is not None and args.config_batch_size < 1:
+        parser.error("--config-batch-size must be at least 1")
+    return args
+
+def apply_config_defaults(args: argparse.Namespace) -> argparse.Namespace:
+    """Fill options left unset on the command line from the loaded CONFIG."""
+    if getattr(args, 'csv_path', None) is None:
+        args.csv_path = CONFIG['paths']['default_csv_path']
+    if getattr(args, 'hugo_path', None) is None:
+        args.hugo_path = CONFIG['paths']['hugo_posts_path']
+    if getattr(args, 'concurrency', None) is None:
+        args.concurrency = CONFIG.get('scheduler', {}).get('concurrency', 1)
+    if getattr(args, 'config_batch_size', None) is None:
+        args.config_batch_size = CONFIG.get('scheduler', {}).get('config_batch_size', 1)
+    if getattr(args, 'backend', None) is None:
+        args.backend = CONFIG.get('backend', 'vertex')
+    if getattr(args, 'queue', None) is None:
+        args.queue = CONFIG.get('queue', {}).get('path') or None
+    return args
+
+# --- Quick Commands ---
+# These only read the CSV, journal and config, so they never touch the model SDKs.
+REQUIRED_CONFIG_KEYS = [
+    ('api', 'max_retries'), ('api', 'initial_backoff_seconds'),
+    ('models', 'text_model_name'), ('models', 'config_generation_model'), ('models', 'image_model_name'),
+    ('paths', 'default_csv_path'), ('paths', 'hugo_posts_path'), ('azlo_pro_context',),
+]
+
+def validate_config(config: Dict) -> List[str]:
+    """Return a list of problems with the loaded configuration (empty when valid)."""
+    problems = []
+    for key_path in REQUIRED_CONFIG_KEYS:
+        node = config
+        for key in key_path:
+            node = node.get(key) if isinstance(node, dict) else None
+        if node in (None, ""):
+            problems.append(f"Missing required setting '{'.'.join(key_path)}'.")
+    api = config.get('api') or {}
+    for key in ('requests_per_minute', 'max_retries', 'image_concurrency'):
+        value = api.get(key)
+        if value is not None and (not isinstance(value, (int, float)) or value <= 0):
+            problems.append(f"'api.{key}' must be a positive number (got {value!r}).")
+    adaptive = api.get('adaptive') or {}
+    for key in ('max_concurrency', 'min_concurrency'):
+        value = adaptive.get(key)
+        if value is not None and (not isinstance(value, int) or value < 1):
+            problems.append(f"'api.adaptive.{key}' must be a whole number of at least 1 (got {value!r}).")
+    factor = adaptive.get('decrease_factor')
+    if factor is not None and not (isinstance(factor, (int, float)) and 0 < factor < 1):
+        problems.append(f"'api.adaptive.decrease_factor' must be between 0 and 1 (got {factor!r}).")
+    if not isinstance(api.get('model_budgets') or {}, dict):
+        problems.append("'api.model_budgets' must map model names to their budgets.")
+    if config.get('backend', 'vertex') == 'vertex':
+        vertex = config.get('vertex_ai') or {}
+        for key in ('gcp_project_id', 'gcp_location'):
+            if not vertex.get(key) or str(vertex[key]).startswith('your-'):
+                problems.append(f"'vertex_ai.{key}' is not set to a real value.")
+    return problems
+
+def validate_titles_csv(csv_path: str) -> List[str]:
+    """Return a list of problems with a titles CSV (empty when valid)."""
+    path = Path(csv_path)
+    if not path.is_file():
+        return [f"CSV file not found: {csv_path}"]
+    problems, seen, blank_rows = [], {}, 0
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        if next(reader, None) is None:
+            return [f"CSV file is empty: {csv_path}"]
+        for line_number, row in enumerate(reader, 2):
+            title = row[0].strip() if row else ""
+            if not title:
+                blank_rows += 1
+            elif title in seen:
+                problems.append(f"Line {line_number}: duplicate title (first seen on line {seen[title]}): {title}")
+            else:
+                seen[title] = line_number
+    if not seen:
+        problems.append(f"No titles found in {csv_path}.")
+    if blank_rows:
+        logging.info(f"{blank_rows} blank row(s) in {csv_path} will be skipped.")
+    return problems
+
+def run_validate(argv: List[str]) -> int:
+    """`main.py validate [csv]`: check config.yaml and the titles CSV without calling any API."""
+    parser = argparse.ArgumentParser(prog="main.py validate", description="Validate config.yaml and a titles CSV.")
+    parser.add_argument("csv_path", nargs="?", help="CSV file to check (default from config.yaml)")
+    parser.add_argument("--config", default="config.yaml", help="Path to the configuration file")
+    args = parser.parse_args(argv)
+    init_config(args.config, build_governor=False)
+    apply_config_defaults(args)
+
+    problems = validate_config(CONFIG) + validate_titles_csv(args.csv_path)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        print(f"\n{len(problems)} problem(s) found.")
+        return 1
+    print(f"✅ {args.config} and {args.csv_path} look good.")
+    return 0
+
+def run_pending(argv: List[str]) -> int:
+    """`main.py pending [csv]`: list the titles that are neither done in the journal nor already published."""
+    parser = argparse.ArgumentParser(prog="main.py pending", description="List titles that still need generating.")
+    parser.add_argument("csv_path", nargs="?", help="CSV file to check (default from config.yaml)")
+    parser.add_argument("--hugo-path", help="Hugo content/posts directory to check for published bundles "
+                                            "(default from config.yaml)")
+    parser.add_argument("--config", default="config.yaml", help="Path to the configuration file")
+    args = parser.parse_args(argv)
+    init_config(args.config, build_governor=False)
+    apply_config_defaults(args)
+
+    journal = RunJournal(journal_path_for(args.csv_path), read_only=True)
+    counts = Counter()
+    pending = 0
+    for title in iter_pending_titles(iter_titles_from_csv(args.csv_path), journal,
+                                     scan_bundle_index(args.hugo_path), counts):
+        print(title)
+        pending += 1
+    print(f"\n{pending} of {counts['read']} title(s) pending.", file=sys.stderr)
+    return 0
+
+def run_queue(argv: List[str]) -> int:
+    """`main.py queue`: show how far a shared work queue has got, optionally re-queueing failed titles."""
+    parser = argparse.ArgumentParser(prog="main.py queue", description="Show the status of a shared work queue.")
+    parser.add_argument("--queue", help="SQLite queue file (default from config.yaml)")
+    parser.add_argument("--retry-failed", action="store_true", help="Put failed titles back in the queue")
+    parser.add_argument("--config", default="config.yaml", help="Path to the configuration file")
+    args = parser.parse_args(argv)
+    init_config(args.config, build_governor=False)
+    apply_config_defaults(args)
+    if not args.queue:
+        print("No queue configured; pass --queue PATH or set queue.path in config.yaml.")
+        return 1
+
+    queue = WorkQueue(args.queue)
+    if args.retry_failed:
+        print(f"🔁 {queue.retry_failed()} failed title(s) re-queued.")
+    print(f"📬 {queue.path}: {format_queue_counts(queue.counts())}")
+    queue.close()
+    return 0
+
+def init_vertex_backend():
+    """Configure the Gemini API key and Vertex AI project, exiting if either is unusable."""
+    import vertexai
+    from google.generativeai.client import configure
+
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         print("\nERROR: GEMINI_API_KEY environment variable not found.")
@@ -402,35 +1213,559 @@ def main():
         logging.error("FATAL: Could not initialize Vertex AI. Please check your config. %s", e)
         sys.exit(1)
 
+def init_response_cache(args: argparse.Namespace) -> Optional[ResponseCache]:
+    """Create the response cache described in config.yaml, honouring --no-cache/--refresh."""
+    cache_config = CONFIG.get('cache', {})
+    if args.no_cache or not cache_config.get('enabled', True):
+        logging.info("Response cache disabled.")
+        return None
+    ttl_hours = cache_config.get('ttl_hours')
+    return ResponseCache(
+        cache_config.get('response_dir', '.cache/responses'),
+        max_bytes=int(cache_config.get('max_size_mb', 256) * 1_048_576),
+        ttl_seconds=ttl_hours * 3600 if ttl_hours else None,
+        refresh=args.refresh,
+    )
+
+def init_image_cache(args: argparse.Namespace) -> Optional[ImageCache]:
+    """Create the prompt-keyed image cache from config.yaml (off with --no-cache or an empty image_dir)."""
+    cache_config = CONFIG.get('cache', {})
+    if args.no_cache or not cache_config.get('enabled', True) or not cache_config.get('image_dir', '.cache/images'):
+        return None
+    # Images never go stale on their own, so only the size cap applies
+    return ImageCache(
+        cache_config.get('image_dir', '.cache/images'),
+        max_bytes=int(cache_config.get('image_max_size_mb', 1024) * 1_048_576),
+        refresh=args.refresh,
+    )
+
+def init_metrics(window: Optional[int] = None) -> Metrics:
+    """Create this run's metrics recorder, writing JSONL under `metrics.dir` when enabled.
+
+    With `window`, percentiles only cover each series' most recent events (see Metrics).
+    """
+    metrics_config = CONFIG.get('metrics', {})
+    if not metrics_config.get('enabled', True):
+        return Metrics(window=window)
+    run_file = f"run-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl"
+    return Metrics(Path(metrics_config.get('dir', 'metrics')) / run_file, window=window)
+
+def print_metrics_summary(metrics: Metrics):
+    """Print p50/p95 per stage and per API call, the API cost totals, then prompt sizes per stage."""
+    for kind, heading in (('stage', 'Stage'), ('api', 'API call')):
+        summary = metrics.summary(kind)
+        if not summary:
+            continue
+        print(f"{heading:<14}{'count':>7}{'p50 s':>9}{'p95 s':>9}{'max s':>9}{'total s':>10}")
+        for name, stats in summary.items():
+            print(f"{name:<14}{stats['count']:>7}{stats['p50']:>9.2f}{stats['p95']:>9.2f}"
+                  f"{stats['max']:>9.2f}{stats['total']:>10.1f}")
+    totals = metrics.totals('api')
+    print(f"🔁 Retries: {totals['retries']:.0f} | Backoff: {totals['backoff_seconds']:.1f}s "
+          f"| Queued for quota: {totals['queue_seconds']:.1f}s | Image encoding: {totals['encode_seconds']:.1f}s")
+    print(f"🔤 Tokens: {totals['prompt_tokens']:.0f} prompt / {totals['response_tokens']:.0f} response "
+          f"({totals['prompt_chars']:.0f} / {totals['response_chars']:.0f} chars)")
+    sizes = metrics.prompt_sizes()
+    if sizes:
+        print(f"{'Prompt':<14}{'count':>7}{'p50 KB':>9}{'max KB':>9}{'~tokens':>10}")
+        for name, stats in sizes.items():
+            print(f"{name:<14}{stats['count']:>7}{stats['bytes_p50'] / 1024:>9.1f}{stats['bytes_max'] / 1024:>9.1f}"
+                  f"{stats['tokens_total']:>10.0f}")
+
+def print_governor_summary(governor: QuotaGovernor):
+    """Print where each model's adaptive concurrency limit ended up and how often it was throttled."""
+    for model, budget in governor.summary().items():
+        print(f"🚦 {model}: {budget['limit']:.1f} call(s) in flight allowed, {budget['throttles']} quota error(s) or timeout(s)")
+
+def print_deadline_summary(deadlines: CallDeadlines):
+    """Print timeouts per call stage and, where hedges were sent, how they moved the p99."""
+    for stage, stats in deadlines.summary().items():
+        if not (stats['timeouts'] or stats['hedges']):
+            continue
+        line = f"⏰ {stage}: {stats['timeouts']} timeout(s) in {stats['calls']} call(s)"
+        if stats['hedges']:
+            line += (f" | 🪁 {stats['hedges']} hedge(s) sent, {stats['hedge_wins']} won | p99 {stats['p99']:.2f}s "
+                     f"(vs {stats['p99_unhedged']:.2f}s unhedged)")
+        print(line)
+
+SKIP_REASONS = {
+    'journal': "already completed according to the journal",
+    'published': "already published",
+    'duplicate': "repeated in the CSV",
+}
+
+def print_skipped(counts: Counter):
+    """Print how many titles were skipped and why, if any were."""
+    skipped = [f"{counts[reason]} {label}" for reason, label in SKIP_REASONS.items() if counts[reason]]
+    if skipped:
+        print(f"⏭️  Skipped {sum(counts[reason] for reason in SKIP_REASONS)} title(s): {', '.join(skipped)}")
+
+def format_queue_counts(counts: Dict[str, int]) -> str:
+    return " | ".join(f"{status}: {count}" for status, count in counts.items())
+
+def run_titles_concurrently(titles: Iterable[str], process: Callable[[str, Optional[float]], bool],
+                            concurrency: int, ahead: Optional[int] = None) -> Iterator[Tuple[str, bool]]:
+    """Run `process(title, submitted_at)` on `concurrency` workers, yielding `(title, succeeded)` as each finishes.
+
+    Only `ahead` titles beyond the running ones (by default one per worker)
+    are taken from `titles` early, so the CSV is read as workers free up
+    instead of all at once. Titles claimed from a shared queue pass 0, so a
+    worker never holds leases on titles it cannot start yet.
+    """
+    ahead = concurrency if ahead is None else ahead
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="title") as pool:
+        running: Dict[Future, str] = {}
+        for title in titles:
+            if len(running) >= concurrency + ahead:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield running.pop(future), future.result()
+            running[pool.submit(process, title, time.perf_counter())] = title
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield running.pop(future), future.result()
+
+# --- Bundle Regeneration ---
+REGENERATE_PARTS = ('images', 'text', 'front-matter')
+
+def regenerate_bundle(bundle_path: Path, parts: List[str]) -> bool:
+    """Re-run only the chosen parts of an existing bundle from its record.
+
+    `images` re-renders every image from the stored prompts with the current
+    image model, `text` rewrites the article from the stored plan, and
+    `front-matter` rebuilds index.md (front matter and figure shortcodes) the
+    way assemble_bundle does. The publication date is kept.
+    """
+    bundle_path = Path(bundle_path)
+    record = read_bundle_record(bundle_path)
+    if record is None:
+        logging.warning(f"{bundle_path} has no {BUNDLE_RECORD_NAME}; only bundles generated with it can be regenerated.")
+        return False
+    article_idea, plan = record['article_idea'], record['plan']
+    article_md, article_file = read_recorded_article(bundle_path, record), record.get('article_file')
+    index_path = bundle_path / "index.md"
+    front_matter, body = split_front_matter(index_path.read_text(encoding='utf-8')) if index_path.exists() else ({}, "")
+    date = front_matter.get('date')
+    # Only the parts regenerated now are attributed to the current models
+    models = dict(record.get('models') or {})
+    try:
+        if 'images' in parts:
+            with METRICS.timed('stage', 'images', title=record['title'], reused=False):
+                generate_images(plan, bundle_path)
+            models['image'] = current_models()['image']
+        if 'text' in parts:
+            with METRICS.timed('stage', 'article', title=record['title'], reused=False):
+                article_md, article_file = generate_article_text(plan), None
+            models['text'] = current_models()['text']
+        write_bundle_record(bundle_path, record['title'], article_idea, plan,
+                            None if article_file else article_md, article_file, models)
+        if article_file is None:
+            (bundle_path / ARTICLE_SOURCE_NAME).unlink(missing_ok=True)
+        if 'text' in parts or 'front-matter' in parts:
+            if article_md is not None:
+                images = {marker: str(bundle_path / name) for marker, name in image_filename_map(plan).items()}
+                assemble_bundle(bundle_path, article_idea, plan, article_md, images, date=str(date) if date else None)
+            else:
+                # No stored Markdown to rebuild the shortcodes from: refresh the front matter only
+                title = plan['outline'].get('title', article_idea.get('title', 'Untitled Post'))
+                featured = "featured_image.jpg" if (bundle_path / "featured_image.jpg").exists() else None
+                with AtomicTextWriter(index_path) as writer:
+                    writer.write(render_front_matter(build_front_matter(title, article_idea, plan, featured,
+                                                                        str(date) if date else None)))
+                    writer.write(body)
+        logging.info(f"✅ Regenerated {', '.join(parts)} for {bundle_path.name}")
+        return True
+    except Exception as e:
+        logging.error(f"❌ Failed to regenerate {bundle_path.name}: {e}", exc_info=True)
+        return False
+
+def run_regenerate(argv: List[str]) -> int:
+    """`main.py regenerate --only PART [bundle ...]`: rebuild parts of existing bundles from their records."""
+    parser = argparse.ArgumentParser(prog="main.py regenerate",
+                                     description="Re-run selected stages of existing page bundles.")
+    parser.add_argument("bundles", nargs="*",
+                        help="Bundle directories to regenerate (default: every bundle under the Hugo path)")
+    parser.add_argument("--only", action="append", choices=REGENERATE_PARTS, required=True,
+                        help="Part to regenerate; repeat for several")
+    parser.add_argument("--hugo-path", help="Hugo content/posts directory (default from config.yaml)")
+    parser.add_argument("--config", default="config.yaml", help="Path to the configuration file")
+    parser.add_argument("--concurrency", type=int, help="Number of bundles regenerated at the same time")
+    parser.add_argument("--backend", choices=["vertex", "fake"], help="Model backend")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the on-disk caches")
+    args = parser.parse_args(argv)
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    init_config(args.config)
+    apply_config_defaults(args)
+    # Regenerating should produce fresh answers, so cached ones are never read back
+    args.refresh = True
+    parts = [part for part in REGENERATE_PARTS if part in args.only]
+
+    if args.bundles:
+        bundles = [Path(bundle) for bundle in args.bundles]
+    else:
+        posts = Path(args.hugo_path)
+        # Hidden directories are bundles still being staged
+        bundles = sorted(entry for entry in posts.iterdir() if not entry.name.startswith('.')
+                         and (entry / BUNDLE_RECORD_NAME).exists()) if posts.is_dir() else []
+    if not bundles:
+        print(f"No bundles with a {BUNDLE_RECORD_NAME} found. Nothing to do.")
+        return 0
+    if parts != ['front-matter']:
+        # Front matter alone needs no model calls, so the SDKs and caches are only set up otherwise
+        init_run(args)
+        init_variant_pool()
+
+    print(f"\n♻️  Regenerating {', '.join(parts)} for {len(bundles)} bundle(s), {args.concurrency} at a time\n")
+    started = time.monotonic()
+    successful = 0
+    def process(bundle: str, submitted_at: Optional[float] = None) -> bool:
+        return regenerate_bundle(Path(bundle), parts)
+
+    for bundle, ok in run_titles_concurrently((str(bundle) for bundle in bundles), process, args.concurrency):
+        successful += ok
+    wait_for_variants()
+    METRICS.close()
+    print(f"\n✅ Regenerated: {successful} | ❌ Failed: {len(bundles) - successful} "
+          f"| ⏱️  {time.monotonic() - started:.1f}s")
+    print_metrics_summary(METRICS)
+    return 0 if successful == len(bundles) else 1
+
+# --- Daemon Mode ---
+def until_set(items: Iterable[str], event: threading.Event) -> Iterator[str]:
+    """Yield from `items` until `event` is set."""
+    for item in items:
+        if event.is_set():
+            return
+        yield item
+
+def run_daemon(argv: List[str]) -> int:
+    """`main.py daemon`: keep the models warm and generate titles from CSVs dropped into a spool directory.
+
+    New CSVs are fed into a work queue as they arrive and drained through the
+    usual pipeline. A local HTTP endpoint reports health, queue depth and
+    throughput. SIGINT/SIGTERM finish the titles in flight, then exit.
+    """
+    global CONFIG_BATCHER, BUNDLE_INDEX, DEADLINES
+    # Imported here: http.server pulls in ssl, a noticeable share of startup time
+    from daemon import SpoolDirectory, StatusServer
+    parser = argparse.ArgumentParser(prog="main.py daemon",
+                                     description="Generate posts from title CSVs dropped into a spool directory.")
+    parser.add_argument("--spool", help="Directory to watch for title CSVs (default from config.yaml)")
+    parser.add_argument("--hugo-path", help="Hugo content/posts directory (default from config.yaml)")
+    parser.add_argument("--queue", metavar="PATH",
+                        help="SQLite work queue (default: queue.path from config.yaml, else queue.sqlite in the spool)")
+    parser.add_argument("--port", type=int, help="Port of the local status endpoint (0 turns it off)")
+    parser.add_argument("--concurrency", type=int, help="Number of titles to run through the pipeline at the same time")
+    parser.add_argument("--config-batch-size", type=int, help="Generate configs for this many titles per request")
+    parser.add_argument("--backend", choices=["vertex", "fake"], help="Model backend")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the on-disk caches")
+    parser.add_argument("--config", default="config.yaml", help="Path to the configuration file")
+    args = parser.parse_args(argv)
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.config_batch_size is not None and args.config_batch_size < 1:
+        parser.error("--config-batch-size must be at least 1")
+    init_config(args.config)
+    apply_config_defaults(args)
+    args.refresh = False
+    daemon_config = CONFIG.get('daemon', {})
+    poll_seconds = daemon_config.get('poll_seconds', 10)
+    port = args.port if args.port is not None else daemon_config.get('port', 8765)
+    spool = SpoolDirectory(args.spool or daemon_config.get('spool_dir', './spool'),
+                           daemon_config.get('settle_seconds', 2))
+
+    # Set up once: SDK clients, caches and the quota governor stay warm between files.
+    # Percentiles cover a bounded window of recent calls, so memory stays flat however long it runs.
+    metrics_window = daemon_config.get('metrics_window', 1000)
+    init_run(args, metrics_window)
+    DEADLINES = CallDeadlines.from_config(CONFIG.get('calls'), history=metrics_window)
+    init_variant_pool()
+    BUNDLE_INDEX = scan_bundle_index(args.hugo_path)
+    if args.config_batch_size > 1:
+        CONFIG_BATCHER = Batcher(generate_blog_configs, args.config_batch_size)
+    queue_config = CONFIG.get('queue', {})
+    queue = WorkQueue(args.queue or str(spool.path / 'queue.sqlite'), lease_seconds=queue_config.get('lease_seconds', 300),
+                      max_attempts=queue_config.get('max_attempts', 3))
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    prometheus_path = (METRICS.jsonl_path.with_name(CONFIG.get('metrics', {}).get('prometheus_file', 'blog_generator.prom'))
+                       if METRICS.jsonl_path else None)
+
+    stop, work_ready = threading.Event(), threading.Event()
+    started = time.monotonic()
+    lock = threading.Lock()
+    totals = Counter()
+    completed_at: Deque[float] = deque()
+    last_file: Dict[str, Any] = {}
+
+    def forget_old_completions():
+        # Called with `lock` held, on every completion too, so this stays an hour's worth
+        while completed_at and completed_at[0] < time.monotonic() - 3600:
+            completed_at.popleft()
+
+    def status() -> Dict[str, Any]:
+        uptime = time.monotonic() - started
+        with lock:
+            forget_old_completions()
+            snapshot = dict(totals, posts_last_hour=len(completed_at), last_file=dict(last_file) or None)
+        counts = queue.counts()
+        return {
+            'status': 'stopping' if stop.is_set() else 'running',
+            'worker': worker_id,
+            'uptime_seconds': round(uptime, 1),
+            'spool': str(spool.path),
+            'queue_depth': counts['pending'] + counts['expired'],
+            'queue': counts,
+            'in_flight': snapshot.get('in_flight', 0),
+            'successful': snapshot.get('successful', 0),
+            'failed': snapshot.get('failed', 0),
+            'posts_per_hour': round(snapshot.get('successful', 0) / uptime * 3600, 1) if uptime > 0 else 0.0,
+            'posts_last_hour': snapshot['posts_last_hour'],
+            'files_ingested': snapshot.get('files', 0),
+            'last_file': snapshot['last_file'],
+            'quota': GOVERNOR.summary(),
+            'calls': DEADLINES.summary(),
+        }
+
+    def ingest(path: Path):
+        claimed = spool.claim(path)
+        if claimed is None:
+            return
+        counts = Counter()
+        try:
+            added = queue.enqueue(iter_pending_titles(iter_titles_from_csv(str(claimed)), None, BUNDLE_INDEX, counts))
+        except Exception as e:
+            logging.error(f"Could not queue the titles in {claimed.name}: {e}", exc_info=True)
+            spool.finish(claimed, succeeded=False)
+            return
+        spool.finish(claimed)
+        logging.info(f"📥 {claimed.name}: {added} new title(s) queued from {counts['read']} read")
+        with lock:
+            totals['files'] += 1
+            last_file.update(name=claimed.name, titles_read=counts['read'], titles_queued=added,
+                             at=datetime.now().astimezone().isoformat())
+        work_ready.set()
+
+    def watch_spool():
+        while not stop.is_set():
+            for path in spool.incoming():
+                ingest(path)
+            if prometheus_path:
+                METRICS.write_prometheus(prometheus_path)
+            stop.wait(poll_seconds)
+
+    def process(title: str, submitted_at: Optional[float] = None) -> bool:
+        with lock:
+            totals['in_flight'] += 1
+        succeeded = process_queued_title(queue, worker_id, title, args.hugo_path, False, submitted_at)
+        with lock:
+            totals['in_flight'] -= 1
+            totals['successful' if succeeded else 'failed'] += 1
+            completed_at.append(time.monotonic())
+            forget_old_completions()
+        return succeeded
+
+    def request_stop(signum, frame):
+        logging.info("Stopping: finishing the titles in flight (claimed titles not started yet go back to the queue)...")
+        stop.set()
+        work_ready.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    server = StatusServer(status, METRICS.prometheus_text, daemon_config.get('host', '127.0.0.1'), port).start() if port else None
+    watcher = threading.Thread(target=watch_spool, name="spool-watcher", daemon=True)
+    watcher.start()
+    print(f"\n👀 Watching {spool.path} for title CSVs as {worker_id} ({args.concurrency} title(s) at a time)"
+          + (f"\n🩺 Status: {server.address}/status" if server else "") + "\n")
+
+    with LeaseHeartbeat(queue, worker_id):
+        while not stop.is_set():
+            titles = until_set(batch_ahead(queue.claims(worker_id), args.config_batch_size), stop)
+            for title, ok in run_titles_concurrently(titles, process, args.concurrency, ahead=0):
+                logging.info(f"📈 {'Finished' if ok else 'Failed'}: {title}")
+            work_ready.wait(poll_seconds)
+            work_ready.clear()
+
+    watcher.join()
+    released = queue.release(worker_id)
+    wait_for_variants()
+    final = status()
+    if server:
+        server.stop()
+    queue.close()
+    METRICS.close()
+    if prometheus_path:
+        METRICS.write_prometheus(prometheus_path)
+    print(f"\n✅ Successful: {final['successful']} | ❌ Failed: {final['failed']} | 📥 Files: {final['files_ingested']} "
+          f"| ↩️  Returned to the queue: {released} | ⏱️  Up {final['uptime_seconds']:.0f}s")
+    return 0
+
+COMMANDS: Dict[str, Callable[[List[str]], int]] = {
+    'daemon': run_daemon,
+    'pending': run_pending,
+    'queue': run_queue,
+    'regenerate': run_regenerate,
+    'validate': run_validate,
+}
+
+def main(argv: Optional[List[str]] = None):
+    """Main function to run the blog generation process (or one of the quick commands)."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        sys.exit(COMMANDS[argv[0]](argv[1:]))
+    run_pipeline(argv)
+
+def init_run(args: argparse.Namespace, metrics_window: Optional[int] = None):
+    """Set up the caches, metrics and model backend for a run that calls the models."""
+    global RESPONSE_CACHE, IMAGE_CACHE, BACKEND, METRICS
+    RESPONSE_CACHE = init_response_cache(args)
+    IMAGE_CACHE = init_image_cache(args)
+    METRICS = init_metrics(metrics_window)
+    if args.backend == 'vertex':
+        init_vertex_backend()
+    else:
+        BACKEND = create_backend(CONFIG, args.backend)
+        logging.info("Using the offline '%s' model backend.", args.backend)
+
+def init_variant_pool():
+    """Start the process pool for responsive image variants, if they are enabled."""
+    global VARIANT_POOL
+    variant_config = CONFIG.get('images', {}).get('variants', {})
+    if variant_config.get('enabled'):
+        # Imported here: multiprocessing is a noticeable share of startup time
+        from concurrent.futures import ProcessPoolExecutor
+        VARIANT_POOL = ProcessPoolExecutor(max_workers=variant_config.get('workers') or None)
+
+def wait_for_variants():
+    if VARIANT_POOL is not None:
+        print(f"🖼️  Waiting for {len(VARIANT_FUTURES)} responsive variant job(s)...")
+        VARIANT_POOL.shutdown(wait=True)
+
+def run_pipeline(argv: List[str]):
+    """Generate a bundle for every pending title in the CSV."""
+    global CONFIG_BATCHER, BUNDLE_INDEX
+    args = parse_args(argv)
+    init_config(args.config)
+    apply_config_defaults(args)
+    init_run(args)
+    if args.stream:
+        CONFIG.setdefault('streaming', {})['enabled'] = True
+
     # --- USES CONFIG ---
-    csv_path = sys.argv[1] if len(sys.argv) > 1 else CONFIG['paths']['default_csv_path']
-    hugo_path = sys.argv[2] if len(sys.argv) > 2 else CONFIG['paths']['hugo_posts_path']
-    interval = CONFIG['api']['interval_between_posts_seconds']
+    csv_path, hugo_path = args.csv_path, args.hugo_path
+    concurrency = args.concurrency
 
     print(f"\n🚀 CSV Blog Generator for Hugo")
     print(f"   - CSV File: {csv_path}")
     print(f"   - Hugo Blog Path: {hugo_path}")
-    print(f"   - Interval between posts: {interval} seconds\n")
+    print(f"   - Concurrency: {concurrency} title(s) at a time")
+    print(f"   - Config batch size: {args.config_batch_size} title(s) per request")
+    print(f"   - API budget: {GOVERNOR.shared.rate * 60:g} requests/minute\n")
 
-    titles = load_titles_from_csv(csv_path)
-    if not titles:
-        print("No titles found. Exiting.")
-        sys.exit(1)
+    # --no-resume regenerates every title, including ones that already have a bundle
+    BUNDLE_INDEX = None if args.no_resume else scan_bundle_index(hugo_path)
+    counts = Counter()
+    queue, worker_id, journal = None, None, None
+    if args.queue:
+        # The queue takes over from the journal: it tracks what is done across every worker
+        queue_config = CONFIG.get('queue', {})
+        queue = WorkQueue(args.queue, lease_seconds=queue_config.get('lease_seconds', 300),
+                          max_attempts=queue_config.get('max_attempts', 3))
+        worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        added = queue.enqueue(iter_pending_titles(iter_titles_from_csv(csv_path), None, BUNDLE_INDEX, counts))
+        print(f"📬 Work queue {queue.path}: {added} new title(s) enqueued, working as {worker_id}")
+        titles = queue.claims(worker_id)
+    else:
+        journal = None if args.no_resume else RunJournal(journal_path_for(csv_path))
+        titles = iter_pending_titles(iter_titles_from_csv(csv_path), journal, BUNDLE_INDEX, counts)
+    # Pull the first title now so an empty or finished CSV exits before any setup
+    first_title = next(titles, None)
+    if first_title is None:
+        if journal:
+            journal.close()
+        if queue:
+            print(f"Nothing left to claim in {queue.path}: {format_queue_counts(queue.counts())}")
+            queue.close()
+            return
+        if not counts['read']:
+            print("No titles found. Exiting.")
+            sys.exit(1)
+        print_skipped(counts)
+        print("All titles are already done. Nothing to do.")
+        return
+    titles = itertools.chain([first_title], titles)
+
+    def process(title: str, submitted_at: Optional[float] = None) -> bool:
+        if queue:
+            return process_queued_title(queue, worker_id, title, hugo_path, concurrency == 1, submitted_at)
+        return process_single_title(title, hugo_path, concurrency == 1, journal, submitted_at)
+
+    if args.config_batch_size > 1:
+        CONFIG_BATCHER = Batcher(generate_blog_configs, args.config_batch_size)
+
+    init_variant_pool()
 
     successful, failed = 0, 0
-    for i, title in enumerate(titles, 1):
-        print(f"\n{'='*60}\nProcessing {i}/{len(titles)}: {title}\n{'='*60}\n")
-        if process_single_title(title, hugo_path):
-            successful += 1
-        else:
-            failed += 1
-        if i < len(titles):
-            print(f"\n⏳ Waiting {interval} seconds before next post...")
-            time.sleep(interval)
+    started = time.monotonic()
+    # Claimed titles keep their leases while they wait for, and go through, the pipeline
+    with LeaseHeartbeat(queue, worker_id) if queue else nullcontext():
+        while True:
+            if concurrency == 1:
+                for title in batch_ahead(titles, args.config_batch_size, journal):
+                    print(f"\n{'='*60}\nProcessing #{successful + failed + 1}: {title}\n{'='*60}\n")
+                    if process(title):
+                        successful += 1
+                    else:
+                        failed += 1
+            else:
+                for title, ok in run_titles_concurrently(batch_ahead(titles, args.config_batch_size, journal),
+                                                         process, concurrency, ahead=0 if queue else None):
+                    if ok:
+                        successful += 1
+                    else:
+                        failed += 1
+                    print(f"📈 {successful + failed} finished (latest: {title})")
+            # Stay around while other workers hold leases, to take over the titles of any that crash
+            if not (queue and queue.wait_for_work(worker_id, CONFIG.get('queue', {}).get('poll_seconds', 5))):
+                break
+            titles = queue.claims(worker_id)
+    wait_for_variants()
+    elapsed = time.monotonic() - started
+    if journal:
+        journal.close()
+    METRICS.close()
+    posts_per_hour = successful / elapsed * 3600 if elapsed > 0 else 0.0
 
     print(f"\n{'='*60}\n🎉 Processing Complete!")
     print(f"✅ Successful: {successful} | ❌ Failed: {failed}")
+    print_skipped(counts)
+    if queue:
+        print(f"📬 Work queue: {format_queue_counts(queue.counts())}")
+        queue.close()
+    print(f"⏱️  Elapsed: {elapsed:.1f}s | Throughput: {posts_per_hour:.1f} posts/hour "
+          f"| Quota wait: {GOVERNOR.total_wait:.1f}s")
+    print_governor_summary(GOVERNOR)
+    print_deadline_summary(DEADLINES)
+    print(f"🔌 Model clients: {len(CLIENTS.setup_seconds)} created for {CLIENTS.lookups} calls "
+          f"({CLIENTS.total_setup_seconds:.2f}s total setup)")
+    if RESPONSE_CACHE:
+        print(f"🗃️  Response cache: {RESPONSE_CACHE.hits}/{RESPONSE_CACHE.lookups} hits "
+              f"({RESPONSE_CACHE.hit_rate:.0%}) - {RESPONSE_CACHE.hits} API round trips saved")
+    if IMAGE_CACHE:
+        print(f"🖼️  Image cache: {IMAGE_CACHE.hits} hits / {IMAGE_CACHE.misses} misses ({IMAGE_CACHE.hit_rate:.0%}) "
+              f"- {IMAGE_CACHE.bytes_saved / 1_048_576:.1f} MB served from disk instead of Imagen")
+    if CONFIG_BATCHER and CONFIG_BATCHER.batches:
+        print(f"📦 Config batches: {CONFIG_BATCHER.keys_fetched} title(s) in {CONFIG_BATCHER.batches} request(s), "
+              f"{CONFIG_BATCHER.misses} generated on their own")
+    print()
+    print_metrics_summary(METRICS)
+    if METRICS.jsonl_path:
+        prometheus_path = METRICS.jsonl_path.with_name(CONFIG.get('metrics', {}).get('prometheus_file', 'blog_generator.prom'))
+        METRICS.write_prometheus(prometheus_path)
+        print(f"📐 Metrics: {METRICS.jsonl_path} | Prometheus: {prometheus_path}")
     print(f"📁 Blog posts saved to: {hugo_path}\n{'='*60}\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
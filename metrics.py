@@ -0,0 +1,234 @@
+# metrics.py
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Numeric event fields that are summed per API call series in the Prometheus export
+API_TOTALS = {
+    'retries': ('blog_api_retries_total', "Retries after a failed attempt."),
+    'backoff_seconds': ('blog_api_backoff_seconds_total', "Time spent sleeping between retries."),
+    'queue_seconds': ('blog_api_queue_seconds_total', "Time spent waiting on the shared rate limiter."),
+    'timeouts': ('blog_api_timeouts_total', "Attempts abandoned at their stage's deadline."),
+    'hedges': ('blog_api_hedges_total', "Duplicate requests sent for calls running past their stage's p95."),
+    'hedge_wins': ('blog_api_hedge_wins_total', "Hedged calls answered first by the duplicate."),
+    'encode_seconds': ('blog_api_encode_seconds_total', "Time spent re-encoding returned images."),
+    'prompt_chars': ('blog_api_prompt_chars_total', "Characters sent in prompts."),
+    'response_chars': ('blog_api_response_chars_total', "Characters received in text answers."),
+    'prompt_tokens': ('blog_api_prompt_tokens_total', "Prompt tokens reported by the API."),
+    'response_tokens': ('blog_api_response_tokens_total', "Response tokens reported by the API."),
+}
+
+
+# Fields summed over every event of a series, whether or not it is still in the window
+SUMMED_FIELDS = ('seconds', 'prompt_bytes', 'prompt_tokens_estimate') + tuple(API_TOTALS)
+# Fields whose largest value over every event is kept
+MAX_FIELDS = ('seconds', 'prompt_bytes')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `values` (0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _label_value(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_label_value(value)}"' for key, value in labels.items()) + "}"
+
+
+class Series:
+    """Running counts, sums and maxima for one series of events, plus its most recent events.
+
+    The totals cover every event recorded; only the last `window` events (all
+    of them when `window` is None) are kept for percentiles.
+    """
+    __slots__ = ('count', 'errors', 'totals', 'maxima', 'recent')
+
+    def __init__(self, window: Optional[int] = None):
+        self.count = 0
+        self.errors = 0
+        self.totals: Counter = Counter()
+        self.maxima: Dict[str, float] = {}
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=window)
+
+    def add(self, event: Dict[str, Any]):
+        self.count += 1
+        self.errors += event.get('status') != 'ok'
+        for field in SUMMED_FIELDS:
+            self.totals[field] += event.get(field, 0)
+        for field in MAX_FIELDS:
+            self.maxima[field] = max(self.maxima.get(field, 0), event.get(field, 0))
+        self.recent.append(event)
+
+    @classmethod
+    def merged(cls, parts: Iterable["Series"]) -> "Series":
+        """One series covering all of `parts` (e.g. one call's series across models)."""
+        merged = cls()
+        for part in parts:
+            merged.count += part.count
+            merged.errors += part.errors
+            merged.totals.update(part.totals)
+            for field, value in part.maxima.items():
+                merged.maxima[field] = max(merged.maxima.get(field, 0), value)
+            merged.recent.extend(part.recent)
+        return merged
+
+    def values(self, field: str) -> List[float]:
+        """`field` of each event still in the window, for percentiles."""
+        return [event.get(field, 0) for event in self.recent]
+
+
+class Metrics:
+    """Timing events for one run: pipeline stages, individual API calls and the prompts they send.
+
+    Each event is folded into running aggregates per series as it is
+    recorded and, when a `jsonl_path` is given, appended to it as one JSON
+    line. The events themselves are kept for percentiles: all of them, or
+    with a `window` (as in daemon mode) only each series' most recent ones,
+    so memory and the cost of a summary stay flat however long the process
+    runs. `write_prometheus()` exports the aggregates in the Prometheus text
+    format, e.g. for node_exporter's textfile collector.
+    """
+    def __init__(self, jsonl_path: Optional[Path] = None, window: Optional[int] = None):
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self.window = window
+        self._series_by_key: Dict[Tuple[str, str, str], Series] = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record(self, kind: str, name: str, seconds: float, **fields):
+        """Record one finished `stage`, `api` or `prompt` event."""
+        event = {'kind': kind, 'name': name, 'seconds': round(seconds, 6), **fields,
+                 'at': datetime.now().astimezone().isoformat()}
+        key = (kind, name, str(fields.get('model', '')))
+        with self._lock:
+            series = self._series_by_key.get(key)
+            if series is None:
+                series = self._series_by_key[key] = Series(self.window)
+            series.add(event)
+            if self.jsonl_path and self._file is None:
+                # Opened on the first event, so a run with nothing to do leaves no empty file
+                self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.jsonl_path, 'a', encoding='utf-8')
+            if self._file is not None:
+                self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    @contextmanager
+    def timed(self, kind: str, name: str, **fields) -> Iterator[Dict[str, Any]]:
+        """Time the block and record it; the yielded dict collects extra fields.
+
+        `status` defaults to `ok`, or to the exception's type name if the block raises.
+        """
+        started = time.perf_counter()
+        try:
+            yield fields
+        except BaseException as e:
+            fields['status'] = type(e).__name__
+            raise
+        finally:
+            fields.setdefault('status', 'ok')
+            self.record(kind, name, time.perf_counter() - started, **fields)
+
+    def _series(self, kind: str, by_model: bool = False) -> Dict[Tuple, Series]:
+        """A snapshot of `kind`'s series by name (and model), in first-seen order."""
+        grouped: Dict[Tuple, List[Series]] = {}
+        with self._lock:
+            for (event_kind, name, model), series in self._series_by_key.items():
+                if event_kind == kind:
+                    grouped.setdefault((name, model) if by_model else (name,), []).append(series)
+            return {key: Series.merged(parts) for key, parts in grouped.items()}
+
+    def summary(self, kind: str = 'stage') -> Dict[str, Dict[str, float]]:
+        """Count, p50, p95, max and total seconds per event name, in first-seen order."""
+        summary = {}
+        for (name,), series in self._series(kind).items():
+            seconds = series.values('seconds')
+            summary[name] = {'count': series.count, 'p50': percentile(seconds, 50), 'p95': percentile(seconds, 95),
+                             'max': series.maxima['seconds'], 'total': series.totals['seconds']}
+        return summary
+
+    def totals(self, kind: str = 'api') -> Dict[str, float]:
+        """Sum of every numeric API_TOTALS field across `kind` events."""
+        totals = Counter()
+        for series in self._series(kind).values():
+            totals.update(series.totals)
+        return {field: totals[field] for field in API_TOTALS}
+
+    def prompt_sizes(self) -> Dict[str, Dict[str, float]]:
+        """Count, p50/max/total bytes and total estimated tokens per prompt stage, from `prompt` events."""
+        sizes = {}
+        for (name,), series in self._series('prompt').items():
+            sizes[name] = {'count': series.count, 'bytes_p50': percentile(series.values('prompt_bytes'), 50),
+                           'bytes_max': series.maxima['prompt_bytes'], 'bytes_total': series.totals['prompt_bytes'],
+                           'tokens_total': series.totals['prompt_tokens_estimate']}
+        return sizes
+
+    def prometheus_text(self) -> str:
+        """Render the aggregates in the Prometheus text exposition format."""
+        lines = ["# HELP blog_stage_seconds Wall time of each pipeline stage.",
+                 "# TYPE blog_stage_seconds summary"]
+        for (stage,), series in self._series('stage').items():
+            lines.extend(self._summary_lines('blog_stage_seconds', series, 'seconds', stage=stage))
+
+        api_series = self._series('api', by_model=True)
+        lines += ["# HELP blog_api_call_seconds Wall time of each model call, retries included.",
+                  "# TYPE blog_api_call_seconds summary"]
+        for (call, model), series in api_series.items():
+            lines.extend(self._summary_lines('blog_api_call_seconds', series, 'seconds', call=call, model=model))
+        lines += ["# HELP blog_api_errors_total Model calls that did not succeed.",
+                  "# TYPE blog_api_errors_total counter"]
+        for (call, model), series in api_series.items():
+            lines.append(f"blog_api_errors_total{_labels(call=call, model=model)} {series.errors}")
+        for field, (metric, help_text) in API_TOTALS.items():
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for (call, model), series in api_series.items():
+                lines.append(f"{metric}{_labels(call=call, model=model)} {series.totals[field]:g}")
+
+        prompt_series = self._series('prompt')
+        lines += ["# HELP blog_prompt_bytes Size of each prompt built, before it is sent.",
+                  "# TYPE blog_prompt_bytes summary"]
+        for (prompt,), series in prompt_series.items():
+            lines.extend(self._summary_lines('blog_prompt_bytes', series, 'prompt_bytes', prompt=prompt))
+        lines += ["# HELP blog_prompt_tokens_estimate_total Locally estimated prompt tokens.",
+                  "# TYPE blog_prompt_tokens_estimate_total counter"]
+        for (prompt,), series in prompt_series.items():
+            lines.append(f"blog_prompt_tokens_estimate_total{_labels(prompt=prompt)} "
+                         f"{series.totals['prompt_tokens_estimate']}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _summary_lines(metric: str, series: Series, field: str, **labels) -> List[str]:
+        values = series.values(field)
+        lines = [f"{metric}{_labels(**labels, quantile=q)} {percentile(values, float(q) * 100):g}"
+                 for q in ('0.5', '0.95')]
+        lines.append(f"{metric}_sum{_labels(**labels)} {series.totals[field]:g}")
+        lines.append(f"{metric}_count{_labels(**labels)} {series.count}")
+        return lines
+
+    def write_prometheus(self, path: Path):
+        """Atomically (re)write the Prometheus text file at `path`."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_text(self.prometheus_text(), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -1,80 +1,128 @@
 # prompts.py
 import json
+import textwrap
+from string import Template
+from typing import Any, Dict, List
 
-def get_config_generation_prompt(title: str, context: str) -> str:
-    """Prompt to generate the initial blog post configuration."""
-    return f"""
-    You are a strategic content creator for a freelance developer whose business is described below.
+# Every prompt the pipeline sends is built here. Templates are dedented and
+# assembled once at import (string.Template still scans them on each
+# substitute, which is cheap), and structured inputs are embedded as compact
+# JSON: indentation and repeated context are paid for in tokens and latency
+# on every request.
+
+# Rough characters per token for Gemini's tokenizer on English text
+CHARS_PER_TOKEN = 4
+
+
+def _template(text: str) -> Template:
+    return Template(textwrap.dedent(text).strip() + "\n")
 
+
+CONFIG_TEMPLATE = _template("""
+    You are a strategic content creator for a freelance developer whose business is described below.
+    BUSINESS CONTEXT:
+    ---
+    $context
     ---
+    Your task is to generate the content for a blog post configuration based on the TITLE: "$title"
+    Generate the following fields: `title`, `topic`, `keywords` (JSON list), `azlo_strategic_angle`, `image_style`.
+    Ensure `topic`, `azlo_strategic_angle`, and `image_style` are single continuous paragraphs.
+    Respond ONLY with a valid JSON object. Example: {"title": "...", "topic": "...", "keywords": ["kw1", "kw2"], "azlo_strategic_angle": "...", "image_style": "..."}
+""")
+
+CONFIG_BATCH_TEMPLATE = _template("""
+    You are a strategic content creator for a freelance developer whose business is described below.
     BUSINESS CONTEXT:
-    {context}
     ---
+    $context
+    ---
+    Your task is to generate the content for one blog post configuration for each of these TITLES:
+    $titles
+    For each title generate the following fields: `title` (copied exactly), `topic`, `keywords` (JSON list), `azlo_strategic_angle`, `image_style`.
+    Ensure `topic`, `azlo_strategic_angle`, and `image_style` are single continuous paragraphs.
+    Respond ONLY with a valid JSON array holding one object per title, in the same order. Example: [{"title": "...", "topic": "...", "keywords": ["kw1", "kw2"], "azlo_strategic_angle": "...", "image_style": "..."}]
+""")
+
+PLAN_TEMPLATE = _template("""
+    You are a senior content strategist for Azlo.pro. Create a plan for a blog post.
+    **Outline Structure:** `title`, `summary`, `introduction_heading`, `introduction`, `sections` (array of {title, talking_points}), `conclusion`.
+    The `conclusion` MUST end with a markdown link: `[contact Azlo.pro to discuss your project](https://azlo.pro/index.html#contact)`.
+    **Image Plan Structure:** An array of {`placement_marker`, `generation_prompt`, `alt_text`}.
+    The first image marker MUST be `[FEATURED_IMAGE_MARKER]`. Include at least two other unique markers like `[IN_CONTENT_IMAGE_1_MARKER]`.
+    **Output:** Respond ONLY with a single, valid JSON object with `outline` and `image_plan` keys.
+    $strategic_instruction
+    Full Article Configuration (JSON):
+    ---
+    $article_idea
+    ---
+""")
+
+STRATEGIC_INSTRUCTION_TEMPLATE = _template("""
+    CRITICAL INSTRUCTION: Weave this strategic angle throughout the content:
+    ---
+    $angle
+    ---
+""")
+
+ARTICLE_TEMPLATE = _template("""
+    You are a senior tech writer for Azlo.pro. Write a complete blog post in GitHub Flavored Markdown based *exactly* on the provided JSON plan.
+    **CRITICAL RULES:**
+    1.  **No Main Title:** Do NOT write a main H1 title ('#').
+    2.  **Start with Featured Image:** The response MUST start with the featured image's `placement_marker`.
+    3.  **Summary Next:** After the marker, write the `summary` as plain text (no blockquotes).
+    4.  **Structure:** Use '---' after the summary, H3 ('###') for the intro heading, and H2 ('##') for section titles.
+    5.  **Place Markers:** You MUST insert the *exact* `placement_marker` strings (e.g., `[IN_CONTENT_IMAGE_1_MARKER]`) from the plan where visuals are needed. DO NOT generate Hugo shortcodes like `{{< figure >}}`.
+    **Article Plan (Your Source of Truth):**
+    ---
+    $plan
+    ---
+""")
+
 
-    Your task is to generate a configuration for a blog post based on the following title.
+def compact_json(value: Any) -> str:
+    """JSON without indentation or spaces after separators; non-ASCII text is kept as is."""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
 
-    TITLE: "{title}"
 
-    Generate the following fields:
-    1.  `title`: Use the exact title provided.
-    2.  `topic`: A detailed paragraph on what the article will cover.
-    3.  `keywords`: A JSON list of 10-12 highly relevant SEO keywords.
-    4.  `target_audience`: A detailed paragraph describing the ideal reader for this article.
-    5.  `azlo_strategic_angle`: A detailed paragraph on how this article connects to the business's core services.
-    6.  `image_style`: A paragraph describing the visual style for the article's images.
+def estimate_tokens(text: str) -> int:
+    """Local token estimate for a prompt, good enough for budgeting before it is sent."""
+    return -(-len(text) // CHARS_PER_TOKEN)
 
-    Respond ONLY with a valid JSON object. Do not include markdown fences (```json).
-    Example: {{"title": "...", "topic": "...", "keywords": ["kw1"], "target_audience": "...", "azlo_strategic_angle": "...", "image_style": "..."}}
+
+def prompt_size(prompt: str) -> Dict[str, int]:
+    """Bytes on the wire and estimated tokens of a prompt."""
+    return {'prompt_bytes': len(prompt.encode('utf-8')), 'prompt_tokens_estimate': estimate_tokens(prompt)}
+
+
+def get_config_generation_prompt(title: str, context: str) -> str:
+    """Prompt to generate the configuration for one title."""
+    return CONFIG_TEMPLATE.substitute(context=context.strip(), title=title)
+
+
+def get_config_batch_prompt(titles: List[str], context: str) -> str:
+    """Prompt to generate the configurations for several titles, sharing one copy of the context."""
+    numbered_titles = "\n".join(f'{i}. "{title}"' for i, title in enumerate(titles, 1))
+    return CONFIG_BATCH_TEMPLATE.substitute(context=context.strip(), titles=numbered_titles)
+
+
+def get_plan_generation_prompt(article_idea: Dict[str, Any]) -> str:
+    """Prompt to generate the outline and image plan from a title's configuration.
+
+    The strategic angle is stated once, as an instruction, rather than again
+    inside the configuration.
     """
+    angle = article_idea.get('azlo_strategic_angle')
+    instruction = STRATEGIC_INSTRUCTION_TEMPLATE.substitute(angle=angle).rstrip() if angle else ""
+    idea = {key: value for key, value in article_idea.items() if key != 'azlo_strategic_angle' or not angle}
+    return PLAN_TEMPLATE.substitute(strategic_instruction=instruction, article_idea=compact_json(idea))
+
 
-def get_plan_generation_prompt(config: dict) -> str:
-    """Prompt to generate the blog post outline and image plan."""
-    # This function appears correct and does not need changes based on the logs.
-    return f"""
-You are a senior content strategist. Create a plan for a blog post based on the configuration below.
-
-**Outline Structure:**
-- `title`: The main title.
-- `summary`: A concise, 2-3 sentence summary.
-- `introduction_heading`: An H3 heading for the introduction.
-- `introduction`: Paragraphs for the intro.
-- `sections`: An array of objects, each with `title` (H2 heading) and `talking_points`.
-- `conclusion`: A concluding section ending with a call to action linking to `https://azlo.pro/index.html#contact`.
-
-**Image Plan:**
-- An array of image objects.
-- The first image MUST use the marker `[FEATURED_IMAGE_MARKER]`.
-- Include at least two other in-content images with unique markers (e.g., `[IN_CONTENT_IMAGE_1_MARKER]`).
-- Each object needs: `placement_marker`, `generation_prompt`, `alt_text`.
-
-**CRITICAL INSTRUCTION:** Weave this strategic angle throughout the outline:
----
-{config.get('article_idea', {}).get('azlo_strategic_angle', 'N/A')}
----
-
-**Full Article Configuration:**
----
-{json.dumps(config.get('article_idea', {}), indent=2)}
----
-
-Respond ONLY with a valid JSON object containing `outline` and `image_plan` keys.
-"""
-
-def get_article_generation_prompt(plan: dict) -> str:
-    """Prompt to generate the final article markdown from the plan."""
-    # This function appears correct and does not need changes based on the logs.
-    return f"""
-You are a senior tech writer. Write a blog post in GitHub Flavored Markdown based *exactly* on the provided JSON plan.
-
-**CRITICAL RULES:**
-1.  **No H1 Title:** Do not write a main H1 title.
-2.  **Featured Image First:** Start with the exact `placement_marker` for the featured image.
-3.  **Summary Next:** After the marker, write the `summary` as plain text.
-4.  **Structure:** Use `---` for a horizontal rule, `###` for the intro heading, and `##` for section titles.
-5.  **Image Markers:** Where the plan suggests a visual, insert the *exact* `placement_marker` string (e.g., `[IN_CONTENT_IMAGE_1_MARKER]`). **DO NOT** generate Hugo shortcodes like `{{{{< figure >}}}}`.
-
-**Article Plan (Source of Truth):**
----
-{json.dumps(plan, indent=2)}
----
-"""
+def get_article_generation_prompt(plan: Dict[str, Any]) -> str:
+    """Prompt to write the article Markdown from a plan.
+
+    The writer only places the images, so each image is sent as its marker
+    and alt text; the generation prompts stay with the image stage.
+    """
+    images = [{key: spec[key] for key in ('placement_marker', 'alt_text') if key in spec}
+              for spec in plan.get('image_plan', [])]
+    return ARTICLE_TEMPLATE.substitute(plan=compact_json({**plan, 'image_plan': images}))
@@ -0,0 +1,332 @@
+# ratelimit.py
+import itertools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+# One call every five seconds, the pacing of the old fixed `call_delay_seconds` default
+DEFAULT_REQUESTS_PER_MINUTE = 12
+
+
+def requests_per_minute(api_config: Dict) -> float:
+    """The shared budget from the `api` section, falling back to `call_delay_seconds` or the default."""
+    if api_config.get('requests_per_minute') is not None:
+        return api_config['requests_per_minute']
+    call_delay = api_config.get('call_delay_seconds')
+    if isinstance(call_delay, (int, float)) and call_delay > 0:
+        return 60.0 / call_delay
+    return DEFAULT_REQUESTS_PER_MINUTE
+
+
+class RateLimiter:
+    """A thread-safe token bucket shared by every API call site.
+
+    Tokens refill continuously at `requests_per_minute / 60` per second, up to
+    `burst` tokens. `acquire()` blocks only as long as needed to stay within
+    the budget, so idle time is never spent sleeping.
+    """
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive.")
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1, int(burst))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.total_wait = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Take one token, blocking until one is available. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.total_wait += waited
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def try_acquire(self) -> bool:
+        """Take one token if one is available right now."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def refund(self):
+        """Give back a token that was taken but not used."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class AdaptiveLimit:
+    """How many calls to one model may be in flight, tuned AIMD-style.
+
+    Every successful call raises the limit by `1 / limit` (about one more slot
+    per limit's worth of successes); every quota error or timeout multiplies
+    it by `decrease_factor`. The limit stays between `minimum` and `maximum`.
+    """
+    def __init__(self, maximum: int, minimum: int = 1, decrease_factor: float = 0.5):
+        if not 1 <= minimum <= maximum:
+            raise ValueError("Need 1 <= minimum <= maximum concurrency.")
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1.")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self.throttles = 0
+        self._ready = threading.Condition()
+
+    def acquire(self) -> float:
+        """Take a slot, blocking while the limit is reached. Returns seconds waited."""
+        started = time.monotonic()
+        with self._ready:
+            while self.in_flight >= int(self.limit):
+                self._ready.wait()
+            self.in_flight += 1
+        return time.monotonic() - started
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now."""
+        with self._ready:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def cancel(self):
+        """Give back a slot that was taken but not used, leaving the limit as it is."""
+        with self._ready:
+            self.in_flight -= 1
+            self._ready.notify_all()
+
+    def release(self, throttled: bool = False):
+        with self._ready:
+            self.in_flight -= 1
+            if throttled:
+                self.throttles += 1
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._ready.notify_all()
+
+
+class Slot:
+    """One admitted call's hold on its model's concurrency limit.
+
+    A call given up on (timed out, or beaten by a hedge) keeps running on its
+    own thread; `hold()` keeps the slot taken until it actually finishes, so
+    abandoned requests still count against the limit.
+    """
+    def __init__(self, waited: float):
+        self.waited = waited
+        self._held: List[Future] = []
+
+    def hold(self, future: Future):
+        """Keep the slot taken until `future` is done."""
+        self._held.append(future)
+
+    def release_when_done(self, release: Callable[[], None]):
+        """Call `release` once every held future is done (straight away if none are pending)."""
+        pending = [future for future in self._held if not future.done()]
+        if not pending:
+            release()
+            return
+        remaining = [len(pending)]
+        lock = threading.Lock()
+
+        def finished(done: Future):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                release()
+
+        for future in pending:
+            future.add_done_callback(finished)
+
+
+class ModelBudget:
+    """One model's share of the quota: an adaptive concurrency limit and an optional own rate."""
+    def __init__(self, concurrency: AdaptiveLimit, rate: Optional[RateLimiter] = None):
+        self.concurrency = concurrency
+        self.rate = rate
+
+
+class QuotaGovernor:
+    """Admission control and retries for every model call.
+
+    A call first takes a slot from its model's adaptive concurrency limit,
+    then a token from the model's own rate budget (if one is configured), then
+    one from the budget shared by all models. A quota error or timeout
+    shrinks the model's limit and is retried after an exponential backoff with jitter, so
+    callers that were throttled together do not all come back at once.
+    Throughput settles just under the quota instead of depending on a
+    hand-tuned backoff.
+    """
+    def __init__(self, requests_per_minute: float, burst: int = 1,
+                 model_budgets: Optional[Dict[str, dict]] = None, max_concurrency: int = 16,
+                 min_concurrency: int = 1, decrease_factor: float = 0.5, max_retries: int = 5,
+                 initial_backoff: float = 10.0, max_backoff: float = 120.0,
+                 is_quota_error: Callable[[BaseException], bool] = lambda error: False,
+                 rng: Optional[random.Random] = None):
+        self.shared = RateLimiter(requests_per_minute, burst)
+        self.model_budgets = model_budgets or {}
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+        self.max_retries = max(1, int(max_retries))
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.is_quota_error = is_quota_error
+        self._rng = rng or random.Random()
+        self._budgets: Dict[str, ModelBudget] = {}
+        self._lock = threading.Lock()
+        self.total_wait = 0.0
+
+    @classmethod
+    def from_config(cls, api_config: Dict, is_quota_error: Callable[[BaseException], bool]) -> "QuotaGovernor":
+        """Build the governor from the `api` section of config.yaml.
+
+        Without `requests_per_minute`, the budget comes from the older
+        `call_delay_seconds` setting, or DEFAULT_REQUESTS_PER_MINUTE.
+        """
+        adaptive = api_config.get('adaptive') or {}
+        return cls(requests_per_minute(api_config), api_config.get('request_burst', 1),
+                   model_budgets=api_config.get('model_budgets'),
+                   max_concurrency=adaptive.get('max_concurrency', 16),
+                   min_concurrency=adaptive.get('min_concurrency', 1),
+                   decrease_factor=adaptive.get('decrease_factor', 0.5),
+                   max_retries=api_config.get('max_retries', 5),
+                   initial_backoff=api_config.get('initial_backoff_seconds', 10),
+                   max_backoff=api_config.get('max_backoff_seconds', 120),
+                   is_quota_error=is_quota_error)
+
+    def budget(self, model: str) -> ModelBudget:
+        """The model's budget, created from `model_budgets` the first time the model is called."""
+        with self._lock:
+            budget = self._budgets.get(model)
+            if budget is None:
+                settings = self.model_budgets.get(model) or {}
+                maximum = settings.get('max_concurrency', self.max_concurrency)
+                concurrency = AdaptiveLimit(maximum, min(self.min_concurrency, maximum), self.decrease_factor)
+                rate = (RateLimiter(settings['requests_per_minute'], settings.get('request_burst', 1))
+                        if settings.get('requests_per_minute') else None)
+                budget = self._budgets[model] = ModelBudget(concurrency, rate)
+            return budget
+
+    @contextmanager
+    def slot(self, model: str) -> Iterator[Slot]:
+        """Hold one admitted call to `model` for the duration of the block; yields its Slot.
+
+        The slot is given back once the block ends and every future passed to
+        `Slot.hold()` is done. If the block raises a quota error or times out
+        the model's concurrency limit shrinks, otherwise it grows.
+        """
+        budget = self.budget(model)
+        slot = Slot(budget.concurrency.acquire())
+        throttled = False
+        try:
+            if budget.rate is not None:
+                slot.waited += budget.rate.acquire()
+            slot.waited += self.shared.acquire()
+            with self._lock:
+                self.total_wait += slot.waited
+            yield slot
+        except BaseException as error:
+            throttled = self.is_throttle(error)
+            raise
+        finally:
+            slot.release_when_done(lambda: budget.concurrency.release(throttled))
+
+    def is_throttle(self, error: BaseException) -> bool:
+        """True for errors that mean the model is overloaded: quota errors and timeouts."""
+        return isinstance(error, TimeoutError) or self.is_quota_error(error)
+
+    def try_admit(self, model: str) -> bool:
+        """Take a slot and rate tokens for one call to `model` only if all are free right now.
+
+        Never waits. A True must be paired with `release()` once the call ends.
+        """
+        budget = self.budget(model)
+        if not budget.concurrency.try_acquire():
+            return False
+        if budget.rate is not None and not budget.rate.try_acquire():
+            budget.concurrency.cancel()
+            return False
+        if not self.shared.try_acquire():
+            if budget.rate is not None:
+                budget.rate.refund()
+            budget.concurrency.cancel()
+            return False
+        return True
+
+    def release(self, model: str, error: Optional[BaseException] = None):
+        """End a call admitted by `try_admit()`; a quota error or timeout shrinks the model's limit like in `slot()`."""
+        self.budget(model).concurrency.release(error is not None and self.is_throttle(error))
+
+    def retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after `error` on attempt `attempt` (0-based), or None to give up.
+
+        Only quota errors and timeouts are retried, both after the same "equal
+        jitter" delay: half of the capped exponential backoff, plus a random
+        share of the other half. A stalling backend is given time to recover
+        instead of being sent duplicates of the requests it is still working on.
+        """
+        if attempt >= self.max_retries - 1:
+            return None
+        if not self.is_throttle(error):
+            return None
+        ceiling = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+        with self._lock:
+            return ceiling / 2 + self._rng.uniform(0, ceiling / 2)
+
+    def call(self, model: str, fn: Callable[[Slot], Any], stats: Optional[Dict[str, Any]] = None) -> Any:
+        """Run `fn(slot)` as a call to `model`, retrying quota errors and timeouts.
+
+        `fn` gets the attempt's Slot, to hold it for calls it leaves running. `stats` (e.g. a metrics event) gets `queue_seconds`, `retries` and
+        `backoff_seconds` added to it. The last error is raised once the
+        retries are used up.
+        """
+        stats = stats if stats is not None else {}
+        for key in ('queue_seconds', 'retries', 'backoff_seconds'):
+            stats.setdefault(key, 0)
+        for attempt in itertools.count():
+            try:
+                with self.slot(model) as slot:
+                    stats['queue_seconds'] += slot.waited
+                    return fn(slot)
+            except Exception as error:
+                delay = self.retry_delay(error, attempt)
+                if delay is None:
+                    raise
+                reason = "Timed out" if isinstance(error, TimeoutError) else "Quota exceeded"
+                logging.warning(f"{reason} for '{model}' (attempt {attempt + 1}/{self.max_retries}), "
+                                f"retrying in {delay:.1f}s...")
+                stats['retries'] += 1
+                stats['backoff_seconds'] += delay
+                time.sleep(delay)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Current concurrency limit and quota errors or timeouts seen, by model."""
+        with self._lock:
+            budgets = dict(self._budgets)
+        return {model: {'limit': budget.concurrency.limit, 'throttles': budget.concurrency.throttles}
+                for model, budget in budgets.items()}
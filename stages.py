@@ -0,0 +1,51 @@
+# stages.py
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+
+class StageGraph:
+    """A small dependency graph of pipeline stages.
+
+    Each stage is a callable that receives its dependencies' results as
+    positional arguments, in the order the dependencies were listed. A stage
+    starts as soon as all of its dependencies have finished, so independent
+    stages (e.g. article text and images, which both only need the plan) run
+    at the same time.
+    """
+    def __init__(self):
+        self._stages: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()):
+        """Register a stage. Dependencies must already be registered."""
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' is already defined.")
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s): {', '.join(missing)}")
+        self._stages[name] = (fn, tuple(deps))
+
+    def run(self, on_start: Optional[Callable[[str], None]] = None,
+            on_finish: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Run every stage and return their results by name.
+
+        The first stage to raise stops any further stages from starting; stages
+        already running are allowed to finish before the exception propagates.
+        """
+        results: Dict[str, Any] = {}
+        pending = dict(self._stages)
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(self._stages)), thread_name_prefix="stage") as pool:
+            while pending or running:
+                ready = [name for name, (_, deps) in pending.items() if all(dep in results for dep in deps)]
+                for name in ready:
+                    fn, deps = pending.pop(name)
+                    if on_start:
+                        on_start(name)
+                    running[pool.submit(fn, *(results[dep] for dep in deps))] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    if on_finish:
+                        on_finish(name)
+        return results
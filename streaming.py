@@ -0,0 +1,98 @@
+# streaming.py
+import os
+import re
+from pathlib import Path
+from typing import Dict
+
+
+class MarkerReplacer:
+    """Replaces placement markers in text that arrives in arbitrary chunks.
+
+    A marker may be split across chunk boundaries, so any trailing text that
+    could still grow into a marker is held back until the next chunk (or
+    `flush()`) settles it. Everything else is released immediately.
+    """
+    def __init__(self, replacements: Dict[str, str]):
+        self.replacements = replacements
+        self._pattern = re.compile("|".join(re.escape(marker) for marker in sorted(replacements, key=len, reverse=True))) \
+            if replacements else None
+        self._longest = max((len(marker) for marker in replacements), default=0)
+        self._buffer = ""
+
+    def replace_all(self, text: str) -> str:
+        """Replace every marker in a complete string in a single pass."""
+        if self._pattern is None:
+            return text
+        return self._pattern.sub(lambda match: self.replacements[match.group(0)], text)
+
+    def _held_back_from(self, text: str) -> int:
+        """Index where a possible marker prefix starts at the end of `text`, else len(text)."""
+        start = max(0, len(text) - self._longest + 1)
+        for index in range(start, len(text)):
+            tail = text[index:]
+            if any(marker.startswith(tail) for marker in self.replacements):
+                return index
+        return len(text)
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk and return the text that is now safe to write."""
+        if self._pattern is None:
+            return chunk
+        text = self.replace_all(self._buffer + chunk)
+        cut = self._held_back_from(text)
+        self._buffer = text[cut:]
+        return text[:cut]
+
+    def flush(self) -> str:
+        """Return whatever is still held back once the stream has ended."""
+        text, self._buffer = self._buffer, ""
+        return text
+
+
+def partial_path_for(path: Path) -> Path:
+    """Where the in-progress copy of `path` is written."""
+    return Path(path).with_name(f".{Path(path).name}.partial")
+
+
+def commit_partial(path: Path):
+    """Atomically rename the finished partial copy of `path` into place."""
+    os.replace(partial_path_for(path), path)
+
+
+class AtomicTextWriter:
+    """Writes a text file incrementally through a temp file that is renamed into place.
+
+    Use as a context manager: chunks go to `<dir>/.<name>.partial` as they are
+    written, the rename happens only when the block exits cleanly, and a failed
+    block removes the partial file. With `keep_partial=True` the rename is left
+    to a later `commit()` call, e.g. once the rest of the bundle is ready.
+    """
+    def __init__(self, path: Path, keep_partial: bool = False):
+        self.path = Path(path)
+        self.partial_path = partial_path_for(self.path)
+        self.keep_partial = keep_partial
+        self.bytes_written = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.partial_path, 'w', encoding='utf-8')
+        return self
+
+    def write(self, text: str):
+        if text:
+            self._file.write(text)
+            self.bytes_written += len(text)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if exc_type is not None:
+            self.partial_path.unlink(missing_ok=True)
+        elif not self.keep_partial:
+            self.commit()
+        return False
+
+    def commit(self):
+        """Atomically move the finished partial file to its final name."""
+        commit_partial(self.path)
@@ -0,0 +1,231 @@
+# workqueue.py
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS titles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    bundle_path TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS titles_status ON titles (status, lease_expires);
+"""
+
+STATUSES = ('pending', 'leased', 'done', 'failed')
+
+
+class WorkQueue:
+    """A title queue in a SQLite file that several worker processes can drain.
+
+    Titles move pending -> leased -> done/failed. A claim is a lease that
+    runs out after `lease_seconds` unless renewed, so the titles of a worker
+    that crashed become claimable again; a title whose lease has expired
+    `max_attempts` times is marked failed instead of being retried forever.
+
+    The file can live on a shared volume. The default rollback journal is used
+    rather than WAL, which needs shared memory and so only works on one host.
+    Lease times are wall-clock, so machines sharing a queue need synced clocks.
+    """
+    def __init__(self, path: str, lease_seconds: float = 300, max_attempts: int = 3):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # One connection per process, shared by its threads under the lock
+        self._db = sqlite3.connect(str(self.path), timeout=60, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._db.executescript(SCHEMA)
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(titles)")}
+            if 'bundle_path' not in columns:
+                # Queue files created before bundle paths were tracked
+                self._db.execute("ALTER TABLE titles ADD COLUMN bundle_path TEXT")
+
+    def enqueue(self, titles: Iterable[str], chunk_size: int = 500) -> int:
+        """Add titles that are not queued yet; returns how many were new."""
+        added, chunk = 0, []
+        for title in titles:
+            chunk.append((title, time.time()))
+            if len(chunk) >= chunk_size:
+                added += self._insert(chunk)
+                chunk = []
+        if chunk:
+            added += self._insert(chunk)
+        return added
+
+    def _insert(self, rows) -> int:
+        with self._lock:
+            before = self._db.total_changes
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany("INSERT OR IGNORE INTO titles (title, updated_at) VALUES (?, ?)", rows)
+            self._db.execute("COMMIT")
+            return self._db.total_changes - before
+
+    def claim(self, worker_id: str) -> Optional[str]:
+        """Lease the oldest claimable title to `worker_id`, or return None if there is none."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "UPDATE titles SET status = 'failed', error = 'lease expired ' || attempts || ' time(s)', "
+                    "updated_at = ? WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, now, self.max_attempts))
+                row = self._db.execute(
+                    "SELECT id, title FROM titles WHERE status = 'pending' "
+                    "OR (status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT 1", (now,)).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE titles SET status = 'leased', worker = ?, lease_expires = ?, "
+                        "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (worker_id, now + self.lease_seconds, now, row[0]))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return row[1] if row else None
+
+    def renew(self, worker_id: str) -> int:
+        """Extend every lease `worker_id` holds; returns how many were renewed."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE titles SET lease_expires = ?, updated_at = ? WHERE status = 'leased' AND worker = ?",
+                (now + self.lease_seconds, now, worker_id))
+            return cursor.rowcount
+
+    def set_bundle_dir(self, title: str, worker_id: str, name: str) -> bool:
+        """Remember the bundle directory a leased title is being written to. False if the lease was lost.
+
+        `name` is relative to the Hugo posts path, so it means the same thing
+        on every worker sharing the queue.
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE titles SET bundle_path = ?, updated_at = ? WHERE title = ? AND worker = ? AND status = 'leased'",
+                (name, time.time(), title, worker_id))
+            return cursor.rowcount == 1
+
+    def bundle_dir(self, title: str) -> Optional[str]:
+        """The bundle directory (relative to the Hugo posts path) the last claim of `title` was writing to."""
+        with self._lock:
+            row = self._db.execute("SELECT bundle_path FROM titles WHERE title = ?", (title,)).fetchone()
+        return row[0] if row else None
+
+    def _finish(self, title: str, worker_id: str, status: str, error: Optional[str]) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE titles SET status = ?, error = ?, lease_expires = NULL, updated_at = ? "
+                "WHERE title = ? AND worker = ? AND status = 'leased'",
+                (status, error, time.time(), title, worker_id))
+        if cursor.rowcount != 1:
+            logging.warning(f"Lease on '{title}' was lost before it finished; another worker may have claimed it.")
+        return cursor.rowcount == 1
+
+    def complete(self, title: str, worker_id: str) -> bool:
+        """Mark a leased title done. False if the lease had already passed to another worker."""
+        return self._finish(title, worker_id, 'done', None)
+
+    def fail(self, title: str, worker_id: str, error: str) -> bool:
+        """Mark a leased title failed. False if the lease had already passed to another worker."""
+        return self._finish(title, worker_id, 'failed', error)
+
+    def release(self, worker_id: str) -> int:
+        """Hand every title still leased to `worker_id` back to the queue, e.g. on a clean shutdown."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE titles SET status = 'pending', worker = NULL, lease_expires = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? WHERE status = 'leased' AND worker = ?",
+                (time.time(), worker_id))
+            return cursor.rowcount
+
+    def retry_failed(self) -> int:
+        """Put every failed title back in the queue; returns how many."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE titles SET status = 'pending', worker = NULL, attempts = 0, error = NULL, updated_at = ? "
+                "WHERE status = 'failed'", (time.time(),))
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """Number of titles in each status; expired leases are reported as `expired`."""
+        now = time.time()
+        counts = {status: 0 for status in STATUSES}
+        counts['expired'] = 0
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN 'expired' ELSE status END, COUNT(*) "
+                "FROM titles GROUP BY 1", (now,)).fetchall()
+        counts.update(dict(rows))
+        return counts
+
+    def claims(self, worker_id: str) -> Iterator[str]:
+        """Yield titles as they are claimed for `worker_id`, until none is claimable."""
+        while True:
+            title = self.claim(worker_id)
+            if title is None:
+                return
+            yield title
+
+    def wait_for_work(self, worker_id: str, poll_seconds: float = 5.0) -> bool:
+        """Block while other workers hold leases; True once one of their titles becomes claimable.
+
+        Call it once the worker has finished its own titles: it returns False
+        when there is nothing left that could come back to the queue, and True
+        when a title turns claimable (typically because its worker crashed and
+        the lease expired), so the caller can run another round of `claims()`.
+        """
+        while True:
+            now = time.time()
+            with self._lock:
+                claimable, held = self._db.execute(
+                    "SELECT COALESCE(SUM(status = 'pending' OR lease_expires < ?), 0), "
+                    "COALESCE(SUM(status = 'leased' AND worker != ?), 0) FROM titles "
+                    "WHERE status IN ('pending', 'leased')", (now, worker_id)).fetchone()
+            if claimable:
+                return True
+            if not held:
+                return False
+            time.sleep(poll_seconds)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class LeaseHeartbeat:
+    """Renews all of a worker's leases on a background thread while the block runs."""
+    def __init__(self, queue: WorkQueue, worker_id: str, interval: Optional[float] = None):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.interval = interval or queue.lease_seconds / 3
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _beat(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.queue.renew(self.worker_id)
+            except sqlite3.Error as e:
+                logging.warning(f"Could not renew leases for {self.worker_id}: {e}")
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._beat, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return False